@@ -4,7 +4,12 @@ import dash_bootstrap_components as dbc
 import models
 import pickle
 import os
+import copy
 import json
+import hashlib
+import threading
+from collections import OrderedDict
+import pandas as pd
 from flask_caching import Cache
 
 # Get the directory where app.py actually lives
@@ -41,6 +46,12 @@ def fetch_market_data():
 
 #data_obj = models.Data()
 
+#Server-side cache of computed Composite objects, keyed by the session parameters
+#and the version of the market data they were computed on (LRU eviction)
+MODEL_CACHE_SIZE = 32
+model_cache = OrderedDict()
+model_cache_lock = threading.Lock()
+
 MODEL_LIST  = [models.VolSpread, 
                models.VolAutocorr, 
                models.VixSpread, 
@@ -51,6 +62,77 @@ MODEL_LIST  = [models.VolSpread,
                models.TEDSpread, 
                models.CrossVol]
 
+#Fingerprint of the market data so cached models are dropped when the data refreshes
+def data_version(data):
+    hashed = pd.util.hash_pandas_object(data, index=True).values
+    return hashlib.sha1(hashed.tobytes()).hexdigest()
+
+#Params of a new Composite with all its models, the template session stores are normalized on
+def default_params():
+    obj = models.Composite(MODEL_LIST, None)
+    for model in MODEL_LIST:
+        instance = model(None, benchmark=obj.benchmark, from_date=obj.from_date)
+        obj.models[instance.code] = instance
+    return obj.to_dict()
+
+DEFAULT_PARAMS = default_params()
+
+#Session params as obj.to_dict() returns them once applied to a new Composite: models
+#missing from the store keep their defaults and unknown keys are dropped, so a lookup
+#and the entry stored for the same model share one key
+def normalize_params(session_store):
+    params = {key: session_store.get(key, value) for key, value in DEFAULT_PARAMS.items() if key != 'models'}
+    stored = session_store.get('models', {})
+    params['models'] = {code: {key: stored.get(code, {}).get(key, value) for key, value in defaults.items()}
+                        for code, defaults in DEFAULT_PARAMS['models'].items()}
+    return params
+
+def model_key(params, version):
+    params_str = json.dumps(normalize_params(params), sort_keys=True, default=str)
+    return hashlib.sha1((params_str + version).encode('utf-8')).hexdigest()
+
+#Store a computed Composite under the key of its current parameters
+def cache_composite(obj):
+    key = model_key(obj.to_dict(), obj.data_version)
+
+    with model_cache_lock:
+        model_cache[key] = obj
+        model_cache.move_to_end(key)
+        while len(model_cache) > MODEL_CACHE_SIZE:
+            model_cache.popitem(last=False)
+
+    return obj
+
+#Return a computed Composite for the session parameters, only building it on a cache miss.
+#With checkout=True the caller gets its own deep copy (sharing only the read-only market
+#data), so it can mutate it while other callbacks still render the cached object, and
+#hands it back through cache_composite once its parameters have changed
+def get_composite(session_store, checkout=False):
+    current_data = fetch_market_data()
+    version = data_version(current_data)
+    key = model_key(session_store, version)
+
+    obj = None
+    with model_cache_lock:
+        if key in model_cache:
+            model_cache.move_to_end(key)
+            obj = model_cache[key]
+
+    if obj is not None:
+        if checkout is True:
+            return copy.deepcopy(obj, {id(obj.data_obj): obj.data_obj})
+        return obj
+
+    obj = models.Composite(MODEL_LIST, current_data)
+    obj.load_models(session_store)
+    obj.indicator()
+    obj.data_version = version
+
+    if checkout is False:
+        cache_composite(obj)
+
+    return obj
+
 def saved_models():
     models = [{'label':x, 'value':x} for x in os.listdir(MODELS_DIR)]
     return models
@@ -760,8 +842,6 @@ app.layout = html.Div([
               Output('session-store', 'data'), 
               Input("loading-initialization", "id"))
 def initialize_app(_):
-    current_data = fetch_market_data()
-
     path = os.path.join(MODELS_DIR, 'default.json') # os.listdir already includes .json
 
 
@@ -769,10 +849,7 @@ def initialize_app(_):
     with open(path, 'r') as f:
         data_dict = json.load(f)
 
-    obj = models.Composite(MODEL_LIST, current_data)
-    obj.load_models()
-    obj.from_dict(data_dict) 
-    obj.indicator()
+    obj = get_composite(data_dict)
 
     layout_content = [
         dbc.Row([
@@ -804,12 +881,7 @@ def initialize_app(_):
               State('session-store', 'data'))
 def render_content(active_tab, session_store):
 
-    current_data = fetch_market_data()
-    print(session_store)
-    obj = models.Composite(MODEL_LIST, current_data)
-    obj.load_models()
-    obj.from_dict(session_store)
-    obj.indicator()
+    obj = get_composite(session_store)
 
     if active_tab == "VOLSPREAD":
         return main_display(inputs=volspread_inputs(obj))
@@ -840,11 +912,7 @@ def render_content(active_tab, session_store):
     State('session-store', 'data'))
 
 def update_chart(active_tab, session_store):
-    current_data = fetch_market_data()
-    obj = models.Composite(MODEL_LIST, current_data)
-    obj.load_models()
-    obj.from_dict(session_store)
-    obj.indicator()
+    obj = get_composite(session_store)
 
     if active_tab == "COMPOSITE":
         fig = obj.plot_indicator_plotly()
@@ -872,11 +940,7 @@ def update_chart(active_tab, session_store):
     prevent_initial_call=True
 )
 def update_volspread(n_clicks, avg_window, upper, lower, above_up, below_low, session_store):
-    current_data = fetch_market_data()
-    obj = models.Composite(MODEL_LIST, current_data)
-    obj.load_models()
-    obj.from_dict(session_store)
-    obj.indicator()
+    obj = get_composite(session_store, checkout=True)
 
     obj.models['VOLSPREAD'].avg_window = avg_window
     obj.models['VOLSPREAD'].upper = upper
@@ -886,6 +950,7 @@ def update_volspread(n_clicks, avg_window, upper, lower, above_up, below_low, se
     
     obj.refresh_models()
     obj.indicator()
+    cache_composite(obj)
 
     session_store = obj.to_dict()
 
@@ -918,11 +983,7 @@ def update_volspread(n_clicks, avg_window, upper, lower, above_up, below_low, se
     prevent_initial_call=True
 )
 def update_volautocorr(n_clicks, lag, upper, lower, above_up, below_low, session_store):
-    current_data = fetch_market_data()
-    obj = models.Composite(MODEL_LIST, current_data)
-    obj.load_models()
-    obj.from_dict(session_store)
-    obj.indicator()
+    obj = get_composite(session_store, checkout=True)
 
     obj.models['VOLAUTOCORR'].lag = lag
     obj.models['VOLAUTOCORR'].upper = upper
@@ -932,6 +993,7 @@ def update_volautocorr(n_clicks, lag, upper, lower, above_up, below_low, session
 
     obj.refresh_models()
     obj.indicator()
+    cache_composite(obj)
 
     session_store = obj.to_dict()
 
@@ -965,11 +1027,7 @@ def update_volautocorr(n_clicks, lag, upper, lower, above_up, below_low, session
     prevent_initial_call=True
 )
 def update_VIXVVIX(n_clicks, avg_window, upper, lower, above_up, below_low, session_store):
-    current_data = fetch_market_data()
-    obj = models.Composite(MODEL_LIST, current_data)
-    obj.load_models()
-    obj.from_dict(session_store)
-    obj.indicator()
+    obj = get_composite(session_store, checkout=True)
 
     obj.models['VIXVVIX'].avg_window = avg_window
     obj.models['VIXVVIX'].upper = upper
@@ -979,6 +1037,7 @@ def update_VIXVVIX(n_clicks, avg_window, upper, lower, above_up, below_low, sess
     
     obj.refresh_models()
     obj.indicator()
+    cache_composite(obj)
 
     session_store = obj.to_dict()
 
@@ -1009,11 +1068,7 @@ def update_VIXVVIX(n_clicks, avg_window, upper, lower, above_up, below_low, sess
     prevent_initial_call=True
 )
 def update_GEX(n_clicks,  upper, lower, above_up, below_low, session_store):
-    current_data = fetch_market_data()
-    obj = models.Composite(MODEL_LIST, current_data)
-    obj.load_models()
-    obj.from_dict(session_store)
-    obj.indicator()
+    obj = get_composite(session_store, checkout=True)
 
     obj.models['GEX'].upper = upper
     obj.models['GEX'].lower = lower
@@ -1022,6 +1077,7 @@ def update_GEX(n_clicks,  upper, lower, above_up, below_low, session_store):
     
     obj.refresh_models()
     obj.indicator()
+    cache_composite(obj)
 
     session_store = obj.to_dict()
 
@@ -1053,11 +1109,7 @@ def update_GEX(n_clicks,  upper, lower, above_up, below_low, session_store):
     prevent_initial_call=True
 )
 def update_SKEW(n_clicks,  avg_window, upper, lower, above_up, below_low, session_store):
-    current_data = fetch_market_data()
-    obj = models.Composite(MODEL_LIST, current_data)
-    obj.load_models()
-    obj.from_dict(session_store)
-    obj.indicator()
+    obj = get_composite(session_store, checkout=True)
 
     obj.models['SKEW'].avg_window = avg_window
     obj.models['SKEW'].upper = upper
@@ -1067,6 +1119,7 @@ def update_SKEW(n_clicks,  avg_window, upper, lower, above_up, below_low, sessio
     
     obj.refresh_models()
     obj.indicator()
+    cache_composite(obj)
 
     session_store = obj.to_dict()
 
@@ -1096,11 +1149,7 @@ def update_SKEW(n_clicks,  avg_window, upper, lower, above_up, below_low, sessio
     prevent_initial_call=True
 )
 def update_TERM(n_clicks, upper, lower, above_up, below_low, session_store):
-    current_data = fetch_market_data()
-    obj = models.Composite(MODEL_LIST, current_data)
-    obj.load_models()
-    obj.from_dict(session_store)
-    obj.indicator()
+    obj = get_composite(session_store, checkout=True)
 
     obj.models['TERM'].upper = upper
     obj.models['TERM'].lower = lower
@@ -1109,6 +1158,7 @@ def update_TERM(n_clicks, upper, lower, above_up, below_low, session_store):
     
     obj.refresh_models()
     obj.indicator()
+    cache_composite(obj)
 
     session_store = obj.to_dict()
 
@@ -1137,11 +1187,7 @@ def update_TERM(n_clicks, upper, lower, above_up, below_low, session_store):
     prevent_initial_call=True
 )
 def update_MOVE(n_clicks, upper, lower, above_up, below_low, session_store):
-    current_data = fetch_market_data()
-    obj = models.Composite(MODEL_LIST, current_data)
-    obj.load_models()
-    obj.from_dict(session_store)
-    obj.indicator()
+    obj = get_composite(session_store, checkout=True)
 
     obj.models['MOVE'].upper = upper
     obj.models['MOVE'].lower = lower
@@ -1150,6 +1196,7 @@ def update_MOVE(n_clicks, upper, lower, above_up, below_low, session_store):
     
     obj.refresh_models()
     obj.indicator()
+    cache_composite(obj)
 
     session_store = obj.to_dict()
 
@@ -1177,11 +1224,7 @@ def update_MOVE(n_clicks, upper, lower, above_up, below_low, session_store):
     prevent_initial_call=True
 )
 def update_TED(n_clicks, upper, lower, above_up, below_low, session_store):
-    current_data = fetch_market_data()
-    obj = models.Composite(MODEL_LIST, current_data)
-    obj.load_models()
-    obj.from_dict(session_store)
-    obj.indicator()
+    obj = get_composite(session_store, checkout=True)
 
     obj.models['TED'].upper = upper
     obj.models['TED'].lower = lower
@@ -1190,6 +1233,7 @@ def update_TED(n_clicks, upper, lower, above_up, below_low, session_store):
     
     obj.refresh_models()
     obj.indicator()
+    cache_composite(obj)
 
     session_store = obj.to_dict()
 
@@ -1220,11 +1264,7 @@ def update_TED(n_clicks, upper, lower, above_up, below_low, session_store):
     prevent_initial_call=True
 )
 def update_CROSS(n_clicks, avg_window, upper, lower, above_up, below_low, session_store):
-    current_data = fetch_market_data()
-    obj = models.Composite(MODEL_LIST, current_data)
-    obj.load_models()
-    obj.from_dict(session_store)
-    obj.indicator()
+    obj = get_composite(session_store, checkout=True)
 
     obj.models['CROSS'].avg_window = avg_window
     obj.models['CROSS'].upper = upper
@@ -1234,6 +1274,7 @@ def update_CROSS(n_clicks, avg_window, upper, lower, above_up, below_low, sessio
     
     obj.refresh_models()
     obj.indicator()
+    cache_composite(obj)
 
     session_store = obj.to_dict()
 
@@ -1262,11 +1303,7 @@ def update_CROSS(n_clicks, avg_window, upper, lower, above_up, below_low, sessio
     prevent_initial_call=True
 )
 def update_COMPOSITE(n_clicks,  upper, lower, above_up, below_low, session_store):
-    current_data = fetch_market_data()
-    obj = models.Composite(MODEL_LIST, current_data)
-    obj.load_models()
-    obj.from_dict(session_store)
-    obj.indicator()
+    obj = get_composite(session_store, checkout=True)
 
     obj.upper = upper
     obj.lower = lower
@@ -1275,6 +1312,7 @@ def update_COMPOSITE(n_clicks,  upper, lower, above_up, below_low, session_store
 
     obj.refresh_models()
     obj.indicator()
+    cache_composite(obj)
 
     session_store = obj.to_dict()
 
@@ -1301,11 +1339,8 @@ def save_model(n_clicks, save_as, session_store):
         return "Please provide a filename"
 
     try:
-        current_data = fetch_market_data()
-        # 2. Setup Object (Skip .indicator() if it's just for math)
-        obj = models.Composite(MODEL_LIST, current_data)
-        obj.load_models()
-        obj.from_dict(session_store)
+        # 2. Setup Object (served from the model cache when available)
+        obj = get_composite(session_store)
         
         # 3. Construct Path correctly
         path = os.path.join(MODELS_DIR, f"{save_as}.json")
@@ -1343,11 +1378,7 @@ def load_model(n_clicks, select_model, active_tab):
             data_dict = json.load(f)
         
         # 2. Reconstruct and Calculate
-        current_data = fetch_market_data()
-        new_obj = models.Composite(MODEL_LIST, current_data)
-        new_obj.load_models() # Ensure sub-models are initialized
-        new_obj.from_dict(data_dict) 
-        new_obj.indicator() 
+        new_obj = get_composite(data_dict)
 
         # 3. Prepare the specific UI for the current tab
         if active_tab == "VOLSPREAD":
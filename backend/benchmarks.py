@@ -0,0 +1,449 @@
+import sys
+import time
+import json
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from content.admin import Database
+from content import eod, source, transport
+from rolling import rolling_autocorr, rolling_zscore, rolling_corr, rolling_avg_corr
+
+
+#Synthetic 1-minute bars shaped like the intraday table
+def synthetic_intraday(rows, symbols=['SPY'], start='2022-05-16 09:30'):
+    rng = np.random.default_rng(0)
+    per_symbol = rows // len(symbols)
+    dates = pd.date_range(start=start, periods=per_symbol, freq='min')
+
+    frames = []
+    for symbol in symbols:
+        close = 400 + rng.normal(0, 0.1, per_symbol).cumsum()
+        frame = pd.DataFrame({'datetime': dates,
+                              'close': close,
+                              'open': close + rng.normal(0, 0.05, per_symbol),
+                              'high': close + 0.1,
+                              'low': close - 0.1,
+                              'volume': rng.integers(1000, 100000, per_symbol),
+                              'symbol': symbol})
+        frames.append(frame)
+
+    return pd.concat(frames, ignore_index=True)
+
+
+#Scratch table for the upsert benchmark, dropped at the end of the run
+class UpsertBench(Database):
+
+    def __init__(self, rows):
+        self.table_name = 'bench_upsert'
+        self.constraints = ['datetime', 'symbol']
+
+        Database.__init__(self, self.table_name, self.constraints)
+
+        frame = synthetic_intraday(rows)
+        self.data_ = frame
+        self.columns = frame.columns
+        self.dtypes = frame.dtypes.items()
+
+    def drop_table(self):
+        with self.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(f'DROP TABLE IF EXISTS {self.table_name};')
+        return True
+
+
+#Rows/second of the three upsert paths against the configured database
+def bench_upsert(rows=100000):
+    obj = UpsertBench(rows)
+    obj.create_table()
+
+    results = {}
+    try:
+        for mode in ['values', 'async', 'copy']:
+            obj.upsert_mode = mode
+            start = time.perf_counter()
+            obj.upsert()
+            elapsed = time.perf_counter() - start
+            results[mode] = rows / elapsed
+            print(f'upsert {mode:>6}: {rows:,} rows in {elapsed:.2f}s ({results[mode]:,.0f} rows/s)')
+    finally:
+        obj.drop_table()
+
+    return results
+
+
+#Per-chunk conversion time of intraday timestamps, one 1-minute window of max_req days
+def bench_timestamps(days=100):
+    dates = pd.date_range(start='2024-01-02 09:30', periods=days * 390, freq='min', tz='America/New_York')
+    timestamps = pd.Series(dates.asi8 // 10**9)
+
+    start = time.perf_counter()
+    scalar = [eod.date_convert_out(x) for x in timestamps]
+    scalar_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vector = eod.dates_convert_out(timestamps)
+    vector_time = time.perf_counter() - start
+
+    assert (pd.DatetimeIndex(scalar) == vector).all()
+    print(f'timestamps {len(timestamps):,} bars: scalar {scalar_time:.3f}s, vectorized {vector_time:.4f}s '
+          f'({scalar_time / vector_time:,.0f}x)')
+
+    return scalar_time, vector_time
+
+
+#Synthetic /eod responses, rows daily bars for each symbol
+def synthetic_historical(symbols=80, rows=8000):
+    rng = np.random.default_rng(0)
+    dates = pd.bdate_range(end='2024-12-31', periods=rows).strftime('%Y-%m-%d').tolist()
+
+    raw_data = {}
+    for i in range(symbols):
+        close = (100 + rng.normal(0, 1, rows).cumsum()).round(2).tolist()
+        volume = rng.integers(1000, 10**7, rows).tolist()
+        raw_data[f'SYM{i}'] = [{'date': day, 'open': c, 'high': c, 'low': c, 'close': c,
+                                'adjusted_close': c, 'volume': v} for day, c, v in zip(dates, close, volume)]
+    return raw_data
+
+
+#Batch frame build of an 80-symbol full-history batch: the previous per-symbol
+#concat into a growing frame (plus the prep_raw copy) against Historical.build
+def bench_historical_build(symbols=80, rows=8000):
+    raw_data = synthetic_historical(symbols, rows)
+    obj = eod.Historical([])
+
+    start = time.perf_counter()
+    diclis = []
+    for _ in raw_data:
+        for entry in raw_data[_]:
+            temp = dict(entry)
+            temp['symbol'] = _
+            diclis.append(temp)
+    frame = pd.DataFrame()
+    for _ in raw_data:
+        temp = pd.DataFrame(raw_data[_])
+        temp['symbol'] = _
+        frame = pd.concat([frame, temp])
+    old_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    new_frame = obj.build(raw_data)
+    new_time = time.perf_counter() - start
+
+    assert len(new_frame) == len(frame) == symbols * rows
+    print(f'historical build {symbols} symbols x {rows:,} bars: concat loop {old_time:.2f}s, '
+          f'single pass {new_time:.2f}s ({old_time / new_time:.1f}x)')
+
+    return old_time, new_time
+
+
+#Decode of a full-history /eod response into the frame Historical.build works
+#from: stdlib json and the fast decoder build a dict per
+#row (fast is orjson when installed), the columnar mode parses the csv format straight into columns
+def bench_decode(rows=8000, repeat=20):
+    synthetic = transport.SyntheticTransport(rows=rows)
+    url = 'https://eodhd.com/api/eod/SPY'
+    json_body = synthetic.respond(url, {})[2]
+    csv_body = synthetic.respond(url, {'fmt': 'csv'})[2]
+
+    decoders = {'json': lambda: pd.DataFrame(json.loads(json_body)),
+                'fast': lambda: pd.DataFrame(source.json_loads(json_body)),
+                'columnar': lambda: source.decode_csv(csv_body)}
+
+    times = {}
+    frames = {}
+    for name, decoder in decoders.items():
+        start = time.perf_counter()
+        for _ in range(repeat):
+            frames[name] = decoder()
+        times[name] = (time.perf_counter() - start) / repeat
+
+    pd.testing.assert_frame_equal(frames['json'], frames['columnar'], check_dtype=False)
+    print(f'decode {rows:,} bars: ' + ', '.join([f'{name} {seconds * 1000:.1f}ms' for name, seconds in times.items()]))
+
+    return times
+
+
+#Synthetic daily volatility frame shaped like AutoCorrVol's (several columns)
+def synthetic_vol(rows=5000, columns=['returns', 'date', 'close', 'volume', 'ann_vol']):
+    rng = np.random.default_rng(0)
+    index = pd.bdate_range(end='2024-12-31', periods=rows)
+    return pd.DataFrame({col: 0.1 + np.abs(rng.normal(0, 0.02, rows).cumsum()) for col in columns}, index=index)
+
+
+#Rolling lag-1 autocorrelation: rolling().apply(lambda) against rolling.rolling_autocorr,
+#checked for equal results on every column
+def bench_autocorr(rows=5000, window=10):
+    vol = synthetic_vol(rows)
+
+    start = time.perf_counter()
+    expected = vol.rolling(window=window).apply(lambda x: x.autocorr(lag=1))
+    lambda_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = rolling_autocorr(vol, window)
+    vector_time = time.perf_counter() - start
+
+    pd.testing.assert_frame_equal(expected, result, rtol=1e-9, atol=1e-12)
+    print(f'autocorr {rows:,} rows x {vol.shape[1]} columns, window {window}: lambda {lambda_time:.2f}s, '
+          f'vectorized {vector_time:.4f}s ({lambda_time / vector_time:,.0f}x)')
+
+    return lambda_time, vector_time
+
+
+#Skew z-score: rolling().apply(lambda) against rolling.rolling_zscore on a
+#SKEW-like index, checked for equal results
+def bench_zscore(rows=8000, window=30):
+    rng = np.random.default_rng(0)
+    skew = pd.Series(130 + rng.normal(0, 1, rows).cumsum(), index=pd.bdate_range(end='2024-12-31', periods=rows))
+
+    start = time.perf_counter()
+    expected = skew.rolling(window=window).apply(lambda x: (x.iloc[-1] - x.mean()) / x.std())
+    lambda_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = rolling_zscore(skew, window)
+    vector_time = time.perf_counter() - start
+
+    pd.testing.assert_series_equal(expected, result, rtol=1e-7, atol=1e-9)
+    print(f'zscore {rows:,} rows, window {window}: lambda {lambda_time:.2f}s, '
+          f'rolling {vector_time:.4f}s ({lambda_time / vector_time:,.0f}x)')
+
+    return lambda_time, vector_time
+
+
+#Cross correlation: per-date rolling correlation matrices (off-diagonal mean, as
+#CrossVol used to) against rolling.rolling_corr for two series and
+#rolling.rolling_avg_corr for columns series, checked for equal results
+def bench_corr(rows=8000, window=30, columns=8):
+    rng = np.random.default_rng(0)
+    index = pd.bdate_range(end='2024-12-31', periods=rows)
+    data = pd.DataFrame(rng.normal(size=(rows, columns)).cumsum(axis=0), index=index)
+
+    results = {}
+    for frame in [data.iloc[:, :2], data]:
+        width = frame.shape[1]
+
+        start = time.perf_counter()
+        matrices = frame.rolling(window=window).corr()
+        off_diagonal = ~np.tile(np.eye(width, dtype=bool), (rows, 1))
+        expected = matrices.where(off_diagonal).mean(axis=1).groupby(level=0).mean()
+        matrix_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        if width == 2:
+            result = rolling_corr(frame.iloc[:, 0], frame.iloc[:, 1], window)
+        else:
+            result = rolling_avg_corr(frame, window)
+        pair_time = time.perf_counter() - start
+
+        pd.testing.assert_series_equal(expected, result, check_names=False, check_freq=False, rtol=1e-9, atol=1e-12)
+        print(f'corr {rows:,} rows x {width} series, window {window}: matrices {matrix_time:.3f}s, '
+              f'pairwise {pair_time:.4f}s ({matrix_time / pair_time:,.0f}x)')
+        results[width] = (matrix_time, pair_time)
+
+    return results
+
+
+#Synthetic market data shaped like models.Data.data, with every column the
+#models read and a few missing values, as in the merged database series
+def synthetic_market(rows=8000, benchmark='GSPC.INDX'):
+    rng = np.random.default_rng(0)
+    index = pd.bdate_range(end='2024-12-31', periods=rows)
+    walk = lambda start, scale: start + np.abs(rng.normal(0, scale, rows).cumsum())
+    data = pd.DataFrame({benchmark: walk(4000, 20), 'VIX.INDX': walk(15, 0.5), 'VVIX.INDX': walk(90, 1),
+                         'VIX1D.INDX': walk(14, 0.7), 'SKEW.INDX': walk(130, 1), 'VIX9D.INDX': walk(14, 0.6),
+                         'VIX3M.INDX': walk(18, 0.4), 'MOVE.INDX': walk(100, 1), 'DTB3': walk(4, 0.01),
+                         'SOFR90DAYAVG': walk(4.2, 0.01), 'ACTVOL': walk(12, 0.6), 'gex': rng.normal(0, 10**9, rows)},
+                        index=index)
+    data.iloc[rng.integers(0, rows, rows // 50), rng.integers(0, data.shape[1], rows // 50)] = np.nan
+    return data
+
+
+#Composite update with the last days, each first sent as a stale intraday copy
+#of the bar and then as the final one, against a full recompute of the
+#composite on the whole history, checked for equal frames on every model
+def bench_model_update(rows=2000, days=20, repeat=50):
+    import models
+    model_list = [models.VolSpread, models.VolAutocorr, models.VixSpread, models.GEX, models.Skew,
+                  models.TermSt, models.MOVEVix, models.TEDSpread, models.CrossVol]
+    data = synthetic_market(rows)
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        full = models.Composite(model_list, data)
+        full.indicator()
+    full_time = (time.perf_counter() - start) / repeat
+
+    incremental = models.Composite(model_list, data.iloc[:-days])
+    incremental.indicator()
+    for position in range(rows - days, rows):
+        bar = data.iloc[position:position + 1]
+        incremental.update(bar * 1.01)
+        #Frames handed out before a same-date update keep their rows
+        held = [incremental.model_data, incremental.signal, incremental.signal_data,
+                incremental.models['VOLSPREAD'].model_data]
+        copies = [frame.copy() for frame in held]
+        incremental.update(bar)
+        for frame, frame_copy in zip(held, copies):
+            pd.testing.assert_frame_equal(frame_copy, frame)
+
+    for obj in [incremental] + list(incremental.models.values()):
+        expected = full if obj is incremental else full.models[obj.code]
+        pd.testing.assert_frame_equal(expected.model_data, obj.model_data, check_freq=False, rtol=1e-9, atol=1e-12)
+        pd.testing.assert_frame_equal(expected.signal, obj.signal, check_freq=False)
+    pd.testing.assert_frame_equal(full.signal_data, incremental.signal_data, check_freq=False)
+
+    incremental.flush_rows()
+    pd.testing.assert_frame_equal(data, incremental.data_obj, check_freq=False)
+
+    #New params of the composite between two updates recompute it
+    changed = models.Composite(model_list, data.iloc[:-5])
+    changed.indicator()
+    changed.update(data.iloc[-5:-4])
+    changed.upper, changed.lower = 0, -10
+    changed.update(data.iloc[-4:])
+    expected = models.Composite(model_list, data)
+    expected.indicator()
+    expected.upper, expected.lower = 0, -10
+    expected.indicator()
+    pd.testing.assert_frame_equal(expected.model_data, changed.model_data, check_freq=False, rtol=1e-9, atol=1e-12)
+    pd.testing.assert_frame_equal(expected.signal, changed.signal, check_freq=False)
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        incremental.update(data.iloc[-1:])
+    update_time = (time.perf_counter() - start) / repeat
+
+    print(f'model update {rows:,} rows, 1 new: full {full_time * 1000:.1f}ms, '
+          f'incremental {update_time * 1000:.2f}ms ({full_time / update_time:,.0f}x)')
+
+    return full_time, update_time
+
+
+#Threshold sweep of a model: indicator() per combination of the grids against
+#one ModelAdmin.sweep, checked for equal signals on every combination
+def bench_sweep(rows=2000, windows=[5, 10, 20, 30, 60], thresholds=10):
+    import models
+    model = models.VolSpread(synthetic_market(rows), benchmark='GSPC.INDX')
+    uppers = np.linspace(0.6, 1.0, thresholds)
+    lowers = np.linspace(0.5, 0.9, thresholds)
+
+    start = time.perf_counter()
+    expected = {}
+    for window in windows:
+        for upper in uppers:
+            for lower in lowers:
+                model.from_dict({'avg_window': window, 'upper': upper, 'lower': lower})
+                expected[(window, upper, lower)] = model.indicator()['SIGNAL']
+    loop_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cube = model.sweep(uppers, lowers, windows)
+    scores = model.score_sweep(cube)
+    sweep_time = time.perf_counter() - start
+
+    for w, window in enumerate(windows):
+        dates = cube['dates'][cube['valid'][w]]
+        for u, upper in enumerate(uppers):
+            for l, lower in enumerate(lowers):
+                signal = pd.Series(cube['signals'][w, u, l][cube['valid'][w]], index=dates, name='SIGNAL')
+                pd.testing.assert_series_equal(expected[(window, upper, lower)], signal,
+                                               check_dtype=False, check_freq=False)
+
+    print(f'sweep {rows:,} rows, {len(scores)} combinations: indicator loop {loop_time:.2f}s, '
+          f'sweep {sweep_time:.4f}s ({loop_time / sweep_time:,.0f}x)')
+
+    return loop_time, sweep_time
+
+
+#Historical object replaying a recording of the synthetic responses of its
+#universe. The recording is made once, untimed, so the timed run measures the
+#client rather than the generator. paced=False swaps the EOD rate limiter for
+#an unbounded one, to measure the pipeline instead of the quota
+def replayed_historical_obj(directory, symbols, rows, latency, paced, columnar=True):
+    obj = eod.Historical([f'SYM{i}' for i in range(symbols)])
+    obj.columnar = columnar
+    if paced is False:
+        obj.source.limiter = source.RateLimiter(per_minute=10**7, max_in_flight=10**4)
+
+    source.set_transport(transport.RecordTransport(directory, inner=transport.SyntheticTransport(rows=rows)))
+    for _ in obj.source.historical_stream(obj.symbols, columnar=columnar, from_date=obj.from_date):
+        pass
+    source.set_transport(transport.ReplayTransport(directory, latency=latency))
+
+    return obj
+
+
+#Offline streamed download and build of a symbol universe, json against
+#columnar decoding, no database needed
+def bench_historical_fetch(symbols=500, rows=2500, latency=0.05, paced=False):
+    directory = tempfile.mkdtemp()
+
+    results = {}
+    try:
+        for columnar in [False, True]:
+            obj = replayed_historical_obj(directory, symbols, rows, latency, paced, columnar)
+
+            start = time.perf_counter()
+            raw_data = {}
+            total = 0
+            for symbol, bars in obj.source.historical_stream(obj.symbols, columnar=columnar, 
+                                                             from_date=obj.from_date):
+                raw_data[symbol] = bars
+                if len(raw_data) == obj.limit:
+                    total += len(obj.build(raw_data))
+                    raw_data = {}
+            total += len(obj.build(raw_data))
+            elapsed = time.perf_counter() - start
+
+            mode = 'columnar' if columnar else 'json'
+            results[mode] = elapsed
+            print(f'historical fetch {mode:>8} {symbols} symbols x {rows:,} bars at {latency * 1000:.0f}ms: '
+                  f'{elapsed:.2f}s ({total / elapsed:,.0f} rows/s)')
+    finally:
+        source.set_transport()
+        shutil.rmtree(directory)
+
+    return results
+
+
+#Full Historical.update_sequence on replayed synthetic responses, written to a
+#scratch table of the configured database and dropped at the end of the run
+def bench_update_sequence(symbols=200, rows=2500, latency=0.05, paced=False):
+    directory = tempfile.mkdtemp()
+    obj = replayed_historical_obj(directory, symbols, rows, latency, paced)
+    obj.table_name = 'bench_historical'
+
+    try:
+        start = time.perf_counter()
+        obj.update_sequence()
+        elapsed = time.perf_counter() - start
+    finally:
+        source.set_transport()
+        shutil.rmtree(directory)
+        with obj.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(f'DROP TABLE IF EXISTS {obj.table_name};')
+
+    print(f'update_sequence {symbols} symbols x {rows:,} bars at {latency * 1000:.0f}ms: {elapsed:.2f}s')
+
+    return elapsed
+
+
+BENCHMARKS = {'upsert': bench_upsert, 
+              'timestamps': bench_timestamps, 
+              'historical_build': bench_historical_build,
+              'decode': bench_decode,
+              'autocorr': bench_autocorr,
+              'zscore': bench_zscore,
+              'corr': bench_corr,
+              'model_update': bench_model_update,
+              'sweep': bench_sweep,
+              'historical_fetch': bench_historical_fetch,
+              'update_sequence': bench_update_sequence}
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        BENCHMARKS[name]()
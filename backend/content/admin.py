@@ -4,21 +4,21 @@ from sqlalchemy import create_engine, MetaData, Table, Column, text
 from sqlalchemy import Integer, String, Float, Boolean, DateTime, UniqueConstraint
 from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.declarative import declarative_base
-import psycopg2 as sql
 import asyncpg
 import asyncio
-import nest_asyncio
 from . import secret
+from . import loops
 import sqlite3 as sl
+import threading
+import atexit
+from contextlib import contextmanager
 
 
-nest_asyncio.apply()
-
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.image import MIMEImage
-from io import BytesIO
+from io import BytesIO, StringIO
 
 
 #Decorator to convert string dates into datetime type
@@ -31,9 +31,28 @@ def convert_dates(date_code):
         return wrapper
     return convert_dates_arg
 
+#Process-wide connection pools, created on first use and shared by every Database
+#object (ingestion classes, models.Data, Views) instead of one connection per call
+engine_ = None
+engine_lock = threading.Lock()
+async_pool_ = None
+async_pool_lock = asyncio.Lock()
+
+def close_pools():
+    global engine_, async_pool_
+    if async_pool_ is not None:
+        loops.run(async_pool_.close())
+        async_pool_ = None
+    if engine_ is not None:
+        engine_.dispose()
+        engine_ = None
+    return True
+
+atexit.register(close_pools)
+
 class Database:
 
-    def __init__(self, table_name, constraints):
+    def __init__(self, table_name, constraints, upsert_mode='values', chunk_size=50000):
         
         self.db_secret = secret.database['AWS']
         self.dtype_mapping = {'int64': 'BIGINT',
@@ -47,18 +66,43 @@ class Database:
         self.user = self.db_secret['user']
         self.password = self.db_secret['password']
         self.port = self.db_secret['port']
+
+        #Pool sizes, overridable from the database secret
+        self.pool_size = self.db_secret.get('pool_size', 5)
+        self.max_overflow = self.db_secret.get('max_overflow', 10)
+        self.async_pool_min = self.db_secret.get('async_pool_min', 1)
+        self.async_pool_max = self.db_secret.get('async_pool_max', 10)
         
         self.conn_string = f'postgresql://{self.user}:{self.password}@{self.host}/{self.database}'
         self.alt_conn_string = f'host={self.host} dbname={self.database} user={self.user} password={self.password} port={self.port}'
         self.table_name = table_name
         self.constraints = constraints
+        self.upsert_mode = upsert_mode
+        self.chunk_size = chunk_size
 
     def engine(self):
-        return create_engine(self.conn_string)
+        global engine_
+        with engine_lock:
+            if engine_ is None:
+                engine_ = create_engine(self.conn_string, 
+                                        pool_size=self.pool_size, 
+                                        max_overflow=self.max_overflow, 
+                                        pool_pre_ping=True)
+        return engine_
     
+    #Raw psycopg2 connection checked out of the shared pool, committed (or rolled
+    #back) and handed back to the pool when the with block exits
+    @contextmanager
     def connection(self):
-        conn = sql.connect(self.alt_conn_string)
-        return conn
+        conn = self.engine().raw_connection()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
         
     def create_table_stmt(self):
         dtypes = self.dtypes
@@ -82,18 +126,23 @@ class Database:
         
         return True
 
+    #Rows of the frame in self.columns order, chunk_size tuples at a time,
+    #with missing values as None. Only one chunk is materialized at once
+    def iter_values(self):
+        frame = self.data_[list(self.columns)]
+        for start in range(0, len(frame), self.chunk_size):
+            chunk = frame.iloc[start:start + self.chunk_size]
+            chunk = chunk.astype(object).where(chunk.notna(), None)
+            yield list(chunk.itertuples(index=False, name=None))
+
     def gather_values(self):
-        data = self.raw_data
         values = []
-        for _ in data:
-            temp_tup=[]
-            for entry in _:
-                temp_tup.append(_[entry])
-            values.append(tuple(temp_tup))
+        for chunk in self.iter_values():
+            values.extend(chunk)
 
         return values
 
-    def upsert_sql(self, cursor):
+    def upsert_sql(self, cursor, values=None):
         columns = self.columns
         constraints = self.constraints
         cols_string = ', '.join(columns).rstrip(', ')
@@ -102,7 +151,8 @@ class Database:
         excludes = list(set(columns) - set(constraints))
         excludes_str = ', '.join([f'{exclude} = EXCLUDED.{exclude}' for exclude in excludes])
 
-        values = self.gather_values()
+        if values is None:
+            values = self.gather_values()
         placeholders = '('+','.join(['%s' for x in columns])+')'
         morg = ','.join(cursor.mogrify(placeholders, i).decode('utf-8') for i in values)
 
@@ -119,8 +169,9 @@ class Database:
 
         with self.connection() as conn:
             cur = conn.cursor()
-            cur.execute(self.upsert_sql(cur))
-            conn.commit()
+            for values in self.iter_values():
+                cur.execute(self.upsert_sql(cur, values))
+                conn.commit()
         
         return True
 
@@ -128,7 +179,6 @@ class Database:
         async with pool.acquire() as connection:
             columns = self.columns
             constraints = self.constraints
-            values = self.gather_values()
 
             cols_string = ', '.join(columns)
             const_string = ', '.join(constraints)
@@ -144,18 +194,71 @@ class Database:
                         DO UPDATE SET {excludes_str};
                         '''
 
-            await connection.executemany(insert_query, values)
+            for values in self.iter_values():
+                await connection.executemany(insert_query, values)
+
+    #asyncpg pool living on the shared background loop
+    async def async_pool(self):
+        global async_pool_
+        async with async_pool_lock:
+            if async_pool_ is None:
+                async_pool_ = await asyncpg.create_pool(user=self.user, 
+                                                        password=self.password, 
+                                                        database=self.database, 
+                                                        host=self.host, 
+                                                        port=int(self.port), 
+                                                        min_size=self.async_pool_min, 
+                                                        max_size=self.async_pool_max)
+        return async_pool_
 
     async def main(self):
-        pool = await asyncpg.create_pool(user=self.user, password=self.password , database=self.database, host=self.host)
+        pool = await self.async_pool()
 
         await self.async_upsert_sql(pool)
-
-        await pool.close()
     
     def upsert_async(self):
-        asyncio.run(self.main())
+        loops.run(self.main())
         return True
+
+    #Bulk path: stream the frame into a temporary staging table with COPY and
+    #merge it into the table with a single INSERT ... SELECT ... ON CONFLICT,
+    #one chunk_size slice of the frame per transaction
+    def upsert_copy(self):
+        columns = list(self.columns)
+        constraints = self.constraints
+        cols_string = ', '.join(columns)
+        const_string = ', '.join(constraints)
+        excludes = list(set(columns) - set(constraints))
+        excludes_str = ', '.join([f'{exclude} = EXCLUDED.{exclude}' for exclude in excludes])
+        stage = f'{self.table_name}_stage'
+
+        frame = self.data_[columns]
+
+        with self.connection() as conn:
+            with conn.cursor() as cur:
+                for start in range(0, len(frame), self.chunk_size):
+                    buffer = StringIO()
+                    frame.iloc[start:start + self.chunk_size].to_csv(buffer, index=False, header=False)
+                    buffer.seek(0)
+
+                    cur.execute(f'''CREATE TEMP TABLE {stage} 
+                                    (LIKE {self.table_name} INCLUDING DEFAULTS) ON COMMIT DROP;''')
+                    cur.copy_expert(f'''COPY {stage} ({cols_string}) FROM STDIN WITH (FORMAT csv)''', buffer)
+                    cur.execute(f'''INSERT INTO {self.table_name} ({cols_string})
+                                    SELECT {cols_string} FROM {stage}
+                                    ON CONFLICT ({const_string})
+                                    DO UPDATE SET {excludes_str};''')
+                    conn.commit()
+
+        return True
+
+    #Upsert through the path selected by the ingestion class:
+    #'values' (single INSERT ... VALUES), 'async' (asyncpg executemany) or 'copy'
+    def upsert(self):
+        modes = {'values': self.upsert_exec, 
+                 'async': self.upsert_async, 
+                 'copy': self.upsert_copy}
+        return modes[self.upsert_mode]()
     
 
 class Views:
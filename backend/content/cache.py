@@ -0,0 +1,121 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from urllib.parse import urlsplit
+
+
+#Query parameters left out of the cache key, so entries never hold the api keys
+secret_params = ['api_token', 'api_key']
+
+#Seconds a stored response is served without asking the provider, by endpoint.
+#Endpoints missing here (intraday bars) are never cached
+endpoint_ttls = {'/eod': 6 * 3600,
+                 '/eod-bulk-last-day': 3600,
+                 '/exchange-symbol-list': 24 * 3600,
+                 '/fundamentals': 24 * 3600,
+                 '/bulk-fundamentals': 24 * 3600,
+                 '/releases': 24 * 3600,
+                 '/release/series': 24 * 3600,
+                 '/series': 24 * 3600,
+                 '/series/observations': 6 * 3600,
+                 '/series/release': 24 * 3600,
+                 '/DIX.csv': 6 * 3600}
+
+default_directory = os.path.join(os.path.expanduser('~'), '.cache', 'ecovol', 'http')
+
+
+#Key of a request: hash of the url and its sorted parameters, api keys left out
+def request_key(url, params):
+    items = sorted([(k, str(v)) for k, v in (params or {}).items() if k not in secret_params])
+    return hashlib.sha1(json.dumps([url, items]).encode()).hexdigest()
+
+
+#On-disk store of raw response bodies keyed by url and parameters.
+#Each entry is a body file and a meta file with the time it was stored and the
+#ETag/Last-Modified validators, used to revalidate it once its ttl is over
+class ResponseCache:
+
+    def __init__(self, directory=None, ttls=None):
+        self.directory = directory or os.environ.get('ECOVOL_HTTP_CACHE', default_directory)
+        self.ttls = ttls or endpoint_ttls
+        os.makedirs(self.directory, exist_ok=True)
+
+    #Ttl of the longest endpoint matching the url path, None if not cacheable
+    def ttl(self, url):
+        path = urlsplit(url).path
+        matches = [endpoint for endpoint in self.ttls
+                   if path.endswith(endpoint) or endpoint + '/' in path]
+        if len(matches) == 0:
+            return None
+        return self.ttls[max(matches, key=len)]
+
+    def key(self, url, params):
+        return request_key(url, params)
+
+    def paths(self, key):
+        base = os.path.join(self.directory, key)
+        return base + '.meta', base + '.body'
+
+    #Function to read an entry, None if missing or unreadable
+    def get(self, key):
+        meta_path, body_path = self.paths(key)
+        try:
+            with open(meta_path) as f:
+                entry = json.load(f)
+            with open(body_path, 'rb') as f:
+                entry['body'] = f.read()
+        except (OSError, ValueError):
+            return None
+        return entry
+
+    def is_fresh(self, entry, url):
+        return time.time() - entry['stored'] < self.ttl(url)
+
+    #Headers asking the provider to answer 304 if the entry is still current
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry.get('etag') is not None:
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified') is not None:
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    #Files are written under a temporary name and renamed, so concurrent
+    #readers never see half an entry
+    def write(self, path, content, mode):
+        temp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temp, mode) as f:
+            f.write(content)
+        os.replace(temp, path)
+        return True
+
+    def put(self, key, body, headers):
+        meta_path, body_path = self.paths(key)
+        meta = {'stored': time.time(),
+                'etag': headers.get('ETag'),
+                'last_modified': headers.get('Last-Modified')}
+        self.write(body_path, body, 'wb')
+        self.write(meta_path, json.dumps(meta), 'w')
+        return True
+
+    #Function to restart the ttl of an entry the provider confirmed with a 304
+    def touch(self, key, entry):
+        meta_path, body_path = self.paths(key)
+        meta = {k: v for k, v in entry.items() if k != 'body'}
+        meta['stored'] = time.time()
+        self.write(meta_path, json.dumps(meta), 'w')
+        return True
+
+
+cache_ = None
+cache_lock = threading.Lock()
+
+#Process-wide cache, created on first use
+def get_cache():
+    global cache_
+    with cache_lock:
+        if cache_ is None:
+            cache_ = ResponseCache()
+    return cache_
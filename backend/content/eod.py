@@ -1,10 +1,15 @@
 import pandas as pd
+import numpy as np
 from . import source
 from .admin import Database
 import re
 from datetime import date, datetime, timedelta, timezone
 import time
 from zoneinfo import ZoneInfo
+from pandas.tseries.offsets import BDay
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import queue
 
 
 #Update set that only takes tickers in the indexes listed above
@@ -13,6 +18,14 @@ def priority_update_set():
     return resp
 
 
+#Function to split a symbol into its EOD code and exchange ('SPY' trades on US)
+def split_symbol(symbol:str):
+    code, _, exchange = symbol.rpartition('.')
+    if code == '':
+        return symbol, 'US'
+    return code, exchange
+
+
 rem_ints = lambda x: re.sub(r'\d+', '', x)
 
 #Function to move any integers to the end of the string when creating
@@ -48,22 +61,41 @@ def date_convert_out(unix_timestamp: int):
     return pd.to_datetime(dt_est)
 
 
+#Vectorized date_convert_out for a whole column of UTC unix timestamps
+def dates_convert_out(unix_timestamps):
+    dates = pd.to_datetime(np.asarray(unix_timestamps), unit='s', utc=True)
+    return pd.DatetimeIndex(dates).tz_convert('America/New_York')
+
+
 #Class to organize and post to database intraday price data
-#for instruments in the EODData api
+#for instruments in the EODData api. Takes one symbol or a list of symbols
 #NOTE: DESIGN SO IT CAN BE USED FOR INDEXES AS WELL AS STOCKS/ETFS
 class Intraday(Database):
 
     def __init__(self, symbol, from_date='2022-05-16 00:00'):
-        self.symbol = symbol
+        if isinstance(symbol, str):
+            self.symbols = [symbol]
+        else:
+            self.symbols = list(symbol)
+        self.symbol = self.symbols[0]
         self.source = source.EODData()
         self.table_name = 'intraday'
         self.from_date = from_date
         self.to_date = datetime.now()
         self.constraints = ['datetime', 'symbol']
         self.max_req = 100
+        self.max_concurrent = 8
+        self.max_symbols = 4
+
+        #Bars are requested as csv and parsed into columns (source.decode_csv)
+        self.columnar = True
+        self.upsert_mode = 'copy'
+
+        #Shared by the workers of update_sequence so they never create the table at once
+        self.table_lock = threading.Lock()
         
 
-        Database.__init__(self, self.table_name, self.constraints)
+        Database.__init__(self, self.table_name, self.constraints, self.upsert_mode)
 
     def update_date(self):
         try:
@@ -81,32 +113,74 @@ class Intraday(Database):
             #If table does not exist, return a very old date
             return self.from_date
 
+    #Last stored datetime of every symbol in one grouped query,
+    #symbols without data (or no table yet) start at from_date
+    def update_dates(self):
+        query = f'''SELECT symbol, MAX(datetime) AS max_datetime
+                    FROM {self.table_name}
+                    WHERE symbol = ANY(%s)
+                    GROUP BY symbol;'''
+        try:
+            with self.connection() as conn:
+                cur = conn.cursor()
+                cur.execute(query, (self.symbols,))
+                resp = cur.fetchall()
+        except Exception:
+            resp = []
+
+        dates = {symbol: self.from_date for symbol in self.symbols}
+        for symbol, max_datetime in resp:
+            if max_datetime is not None:
+                dates[symbol] = max_datetime.strftime("%Y-%m-%d %H:%M:%S.%f")
+
+        return dates
+
+    #Function to turn the bars of one window into a frame indexed by EST datetime
+    def part_frame(self, data):
+        frame = pd.DataFrame(data)
+        frame['datetime'] = dates_convert_out(frame.timestamp)
+        frame.set_index('datetime', inplace=True)
+        return frame[['close','open', 'high', 'low', 'volume']]
+
     def get_data_part(self, from_date, to_date):
         obj = self.source
         from_date = date_convert_in(from_date)
         now_str = to_date
         to_date = date_convert_in(now_str)
         data = obj.intraday([self.symbol], interval="1m" ,from_date=from_date, to=to_date)
-        frame = pd.DataFrame(data)
-        frame['datetime'] = [date_convert_out(x) for x in frame.timestamp]
-        frame.set_index('datetime', inplace=True)
-        return frame[['close','open', 'high', 'low', 'volume']]
-
-
-    def data(self, **kwargs):
-        from_date = self.update_date()
-        to_date = self.to_date
+        return self.part_frame(data)
 
+    #Function to split the range in windows of max_req days (API limit per request)
+    def intervals(self, from_date, to_date):
         intervals = pd.date_range(start=from_date, end=to_date, freq=f'{self.max_req}D')
         intervals = intervals.to_list()
         intervals = [x.strftime("%Y-%m-%d %H:%M:%S.%f") for x in intervals]
         intervals.append(to_date.strftime("%Y-%m-%d %H:%M:%S.%f"))
-        data_lis = []
-        
+        return list(zip(intervals, intervals[1:]))
+
+    #All the windows are requested concurrently (at most max_concurrent in flight)
+    #and concatenated once, in date order
+    def data(self, from_date=None, **kwargs):
+        if from_date is None:
+            from_date = self.update_date()
+        to_date = self.to_date
 
-        for date_init, date_end in zip(intervals, intervals[1:]):
-            data = self.get_data_part(date_init, date_end)
-            data_lis.append(data)
+        windows = [(self.symbol, date_convert_in(date_init), date_convert_in(date_end)) 
+                   for date_init, date_end in self.intervals(from_date, to_date)]
+        responses = self.source.intraday_windows(windows, interval="1m", max_concurrent=self.max_concurrent, 
+                                                 columnar=self.columnar)
+
+        #Windows after a failed one are dropped so the watermark never skips a gap
+        data_lis = []
+        for window in windows:
+            if window not in responses:
+                break
+            if len(responses[window]) > 0:
+                data_lis.append(self.part_frame(responses[window]))
+
+        #No new bars since the last update
+        if len(data_lis) == 0:
+            return None
         
         frame = pd.concat(data_lis)
         frame['symbol'] = self.symbol
@@ -115,7 +189,6 @@ class Intraday(Database):
         
 
         self.data_ = frame
-        self.raw_data = self.data_.to_dict(orient='records')
         
         cols = list(frame.columns)
 
@@ -125,11 +198,41 @@ class Intraday(Database):
 
         return frame
 
-    #Function to run updates on the set specified
+    #Function to fetch and post the bars of self.symbol from from_date.
+    #Concurrent CREATE TABLE IF NOT EXISTS can fail in Postgres on a first run
+    #(pg_type unique violation), so workers create the table under table_lock
+    def update_symbol(self, from_date=None):
+        if self.data(from_date=from_date) is None:
+            return False
+        with self.table_lock:
+            self.create_table()
+        self.upsert()
+
+        return True
+
+    #Function to run updates on the set specified. With several symbols, the
+    #watermarks are read in one query and each symbol is fetched and upserted
+    #in its own worker (max_symbols at a time), so fetches and writes overlap
     def update_sequence(self):
-        self.data()
-        self.create_table()
-        self.upsert_async()
+        if len(self.symbols) == 1:
+            self.update_symbol()
+            return True
+
+        from_dates = self.update_dates()
+
+        with ThreadPoolExecutor(max_workers=self.max_symbols) as executor:
+            futures = []
+            for symbol in self.symbols:
+                obj = Intraday(symbol, from_date=self.from_date)
+                obj.max_req = self.max_req
+                obj.max_concurrent = self.max_concurrent
+                obj.columnar = self.columnar
+                obj.upsert_mode = self.upsert_mode
+                obj.table_lock = self.table_lock
+                futures.append(executor.submit(obj.update_symbol, from_dates[symbol]))
+
+            for future in futures:
+                future.result()
 
         return True
 
@@ -137,7 +240,7 @@ class Intraday(Database):
 #for instruments in the EODData api
 class Historical(Database):
 
-    def __init__(self, symbols:list, from_date='1900-02-01'):
+    def __init__(self, symbols:list, from_date='1900-02-01', pipelined=True, incremental=False, bulk=False):
         self.source = source.EODData()
         self.endpoint = self.source.historical
         self.table_name = 'historical'
@@ -148,32 +251,82 @@ class Historical(Database):
 
         self.ct = 0
         self.limit = 80
-        self.sleep_time = 10
-        self.sleep_ct = 3
-
-        Database.__init__(self, self.table_name, self.constraints)
-
-    def prep_raw(self, raw_data):
-        diclis = []
-        for _ in raw_data:
-            for entry in raw_data[_]:
-                temp = entry
-                temp['symbol'] = _
-                diclis.append(temp)
-        return diclis
-            
+        self.pipelined = pipelined
+        self.queue_size = 2
+
+        #Incremental mode: each symbol is requested from its last stored date
+        #minus overlap days (to pick up corrections), new symbols from from_date
+        self.incremental = incremental
+        self.overlap = 5
+        self.from_dates = None
+
+        #Bulk mode: daily refresh from the exchange-wide last-day endpoint
+        self.bulk = bulk
+        self.bulk_cols = ['date', 'open', 'high', 'low', 'close', 'adjusted_close', 'volume']
+        self.upsert_mode = 'values'
+
+        #Bars are requested as csv and parsed into columns (source.decode_csv)
+        self.columnar = True
+
+        Database.__init__(self, self.table_name, self.constraints, self.upsert_mode)
+
+    #Last stored date of every symbol in one grouped query
+    def last_dates(self):
+        query = f'''SELECT symbol, MAX(date) AS max_date
+                    FROM {self.table_name}
+                    WHERE symbol = ANY(%s)
+                    GROUP BY symbol;'''
+        try:
+            with self.connection() as conn:
+                cur = conn.cursor()
+                cur.execute(query, (list(self.symbols),))
+                resp = cur.fetchall()
+        except Exception:
+            #If table does not exist, no symbol has history yet
+            resp = []
+
+        return {symbol: pd.Timestamp(max_date) for symbol, max_date in resp if max_date is not None}
+
+    #Start date of every symbol with history: last stored date minus the overlap
+    def update_dates(self):
+        dates = {}
+        for symbol, max_date in self.last_dates().items():
+            start = max_date - timedelta(days=self.overlap)
+            dates[symbol] = start.strftime('%Y-%m-%d')
+
+        return dates
+
+    #Function to download the raw responses of a batch of symbols
+    def fetch(self, symbols:list, **kwargs):
+        return self.source.historical(symbols, from_dates=self.from_dates, columnar=self.columnar, **kwargs)
+
     #Function that creates dataframe and cleans data for final
     #posting in the database
     def data(self, symbols:list, filter:str=False, **kwargs):
-        raw_data = self.source.historical(symbols, **kwargs)
-        self.raw_data = self.prep_raw(raw_data)
-
-        frame = pd.DataFrame()
-
-        for _ in raw_data:
-            temp = pd.DataFrame(raw_data[_])
-            temp['symbol'] = _
-            frame = pd.concat([frame, temp])
+        raw_data = self.fetch(symbols, **kwargs)
+        return self.build(raw_data, filter=filter)
+
+    #Function that builds the batch frame from the raw responses with a single
+    #concat of one frame per symbol. The upsert reads its rows from this frame.
+    #Responses are lists of bars, or frames in columnar mode; anything else
+    #(API errors, unknown symbols) is skipped
+    def build(self, raw_data, filter:str=False):
+        frames = []
+        for symbol in raw_data:
+            rows = raw_data[symbol]
+            if isinstance(rows, pd.DataFrame) and len(rows) > 0:
+                temp = rows
+            elif isinstance(rows, list) and len(rows) > 0:
+                temp = pd.DataFrame(rows)
+            else:
+                continue
+            temp['symbol'] = symbol
+            frames.append(temp)
+
+        if len(frames) == 0:
+            frame = pd.DataFrame(columns=['date', 'symbol'])
+        else:
+            frame = pd.concat(frames, ignore_index=True)
 
         if filter == False:
             frame = frame
@@ -192,27 +345,162 @@ class Historical(Database):
 
         return frame
     
+    #Function to split the symbols in batches of self.limit
+    def batches(self):
+        symbols = self.symbols
+        steps = self.limit
+        return [symbols[ct:min(ct+steps, len(symbols))] for ct in range(self.ct, len(symbols), steps)]
+
     #Function to run updates on the set specified
     def update_sequence(self):
-        symbols = self.symbols
-        from_date = self.from_date
+        if self.bulk is True:
+            return self.bulk_sequence()
 
-        steps = self.limit
+        if self.incremental is True:
+            self.from_dates = self.update_dates()
 
-        ct=self.ct
-        sleep_ct = 0
-        while ct <= len(symbols):
-            symbols_set = symbols[ct:min(ct+steps, len(symbols))]
-            print(ct, ct+steps)
-            self.data(symbols_set, from_date=from_date)
+        if self.pipelined is True:
+            return self.pipeline_sequence()
+
+        from_date = self.from_date
+
+        #Throughput is paced by the EOD rate limiter in source, no fixed sleeps
+        for i, symbols_set in enumerate(self.batches()):
+            ct = self.ct + i*self.limit
+            print(ct, ct+self.limit)
+            frame = self.data(symbols_set, from_date=from_date)
+            if len(frame) == 0:
+                continue
             self.create_table()
-            self.upsert_exec()
+            self.upsert()
+
+        return True
+
+    #Pipelined run: a producer thread streams the responses of every symbol and
+    #hands them over in batches of limit symbols, in arrival order, while the main
+    #thread builds and writes the previous batch. A batch is ready as soon as its
+    #first limit responses land, not when the slowest symbol of a fixed list does.
+    #At most queue_size batches wait in the queue, so a slow database holds back
+    #the downloads instead of memory piling up. If the main thread fails, the
+    #producer is stopped and its stream closed, which cancels the requests in flight.
+    #Time spent in each stage is printed at the end
+    def pipeline_sequence(self):
+        from_date = self.from_date
+        timings = {'fetch': 0.0, 'wait': 0.0, 'build': 0.0, 'write': 0.0}
+        batches = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+
+        #Put an item in the queue unless the main thread stopped listening
+        def hand_over(item):
+            while not stop.is_set():
+                try:
+                    batches.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def producer():
+            stream = self.source.historical_stream(self.symbols[self.ct:], from_dates=self.from_dates, 
+                                                   columnar=self.columnar, from_date=from_date)
+            try:
+                raw_data = {}
+                start = time.perf_counter()
+                for symbol, rows in stream:
+                    if stop.is_set():
+                        return
+                    raw_data[symbol] = rows
+                    if len(raw_data) == self.limit:
+                        timings['fetch'] += time.perf_counter() - start
+                        if not hand_over(raw_data):
+                            return
+                        raw_data = {}
+                        start = time.perf_counter()
+
+                timings['fetch'] += time.perf_counter() - start
+                if len(raw_data) > 0:
+                    hand_over(raw_data)
+            except Exception as e:
+                hand_over(e)
+            finally:
+                stream.close()
+                hand_over(None)
+
+        thread = threading.Thread(target=producer, daemon=True)
+        start_run = time.perf_counter()
+        thread.start()
 
-            ct+=steps
-            sleep_ct+=1
-            if sleep_ct == self.sleep_ct:
-                time.sleep(self.sleep_time)
-                sleep_ct = 0
+        try:
+            while True:
+                start = time.perf_counter()
+                raw_data = batches.get()
+                timings['wait'] += time.perf_counter() - start
+
+                if raw_data is None:
+                    break
+                if isinstance(raw_data, Exception):
+                    raise raw_data
+
+                start = time.perf_counter()
+                frame = self.build(raw_data)
+                timings['build'] += time.perf_counter() - start
+                if len(frame) == 0:
+                    continue
+
+                start = time.perf_counter()
+                self.create_table()
+                self.upsert()
+                timings['write'] += time.perf_counter() - start
+        finally:
+            stop.set()
+            thread.join()
+
+        timings['total'] = time.perf_counter() - start_run
+        print(' | '.join([f'{stage}: {seconds:.2f}s' for stage, seconds in timings.items()]))
+        self.timings = timings
 
         return True
 
+    #Daily refresh with one eod-bulk-last-day request per exchange, filtered to
+    #the tracked symbols. Symbols with no history, missing from the bulk response
+    #or whose last stored date is before the previous business day (a gap) fall
+    #back to per-symbol incremental history
+    def bulk_sequence(self):
+        last_dates = self.last_dates()
+        tracked = {split_symbol(symbol): symbol for symbol in self.symbols}
+        exchanges = sorted(set([exchange for code, exchange in tracked]))
+
+        raw_data = self.source.bulk_last_day(exchanges)
+
+        rows = {}
+        for exchange in exchanges:
+            payload = raw_data.get(exchange)
+            if not isinstance(payload, list):
+                continue
+            for entry in payload:
+                symbol = tracked.get((entry.get('code'), exchange))
+                if symbol is not None:
+                    rows[symbol] = {col: entry.get(col) for col in self.bulk_cols}
+
+        fallback = []
+        for symbol in self.symbols:
+            if symbol not in rows or symbol not in last_dates:
+                fallback.append(symbol)
+            elif last_dates[symbol] < pd.Timestamp(rows[symbol]['date']) - BDay(1):
+                fallback.append(symbol)
+
+        bulk_rows = {symbol: [rows[symbol]] for symbol in rows if symbol not in fallback}
+        print(f'bulk: {len(bulk_rows)} symbols, per-symbol fallback: {len(fallback)}')
+
+        if len(bulk_rows) > 0:
+            self.build(bulk_rows)
+            self.create_table()
+            self.upsert()
+
+        if len(fallback) > 0:
+            obj = Historical(fallback, from_date=self.from_date, pipelined=self.pipelined, incremental=True)
+            obj.overlap = self.overlap
+            obj.upsert_mode = self.upsert_mode
+            obj.update_sequence()
+
+        return True
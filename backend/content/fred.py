@@ -23,7 +23,9 @@ class Releases(Database):
                       'link', 
                       'notes']
 
-        Database.__init__(self, self.table_name, self.constraints)
+        self.upsert_mode = 'async'
+
+        Database.__init__(self, self.table_name, self.constraints, self.upsert_mode)
 
     def prep_raw(self, raw_data):
         raw_data = raw_data['releases']['releases']
@@ -55,7 +57,7 @@ class Releases(Database):
         
         self.data()
         self.create_table()
-        self.upsert_async()
+        self.upsert()
 
         return True
     
@@ -83,7 +85,9 @@ class Series(Database):
                       'popularity', 
                       'group_popularity']
 
-        Database.__init__(self, self.table_name, self.constraints)
+        self.upsert_mode = 'async'
+
+        Database.__init__(self, self.table_name, self.constraints, self.upsert_mode)
 
     def prep_raw(self, raw_data):
         raw_data = raw_data
@@ -119,7 +123,7 @@ class Series(Database):
         
         self.data()
         self.create_table()
-        self.upsert_async()
+        self.upsert()
 
         return True 
     
@@ -142,7 +146,9 @@ class Observations(Database):
         self.limit = 500
 
 
-        Database.__init__(self, self.table_name, self.constraints)
+        self.upsert_mode = 'async'
+
+        Database.__init__(self, self.table_name, self.constraints, self.upsert_mode)
 
     def prep_raw(self, raw_data):
         raw_data = raw_data
@@ -162,15 +168,15 @@ class Observations(Database):
 
         return dic_lis
 
+    #Each series is flattened as soon as its response lands
     def data(self):
-        raw_data = self.endpoint(self.series_ids)
-        self.raw_data = self.prep_raw(raw_data)
+        self.raw_data = []
+        for series_id, payload in self.source.observ_stream(self.series_ids):
+            self.raw_data.extend(self.prep_raw({series_id: payload}))
 
         frame = pd.DataFrame(self.raw_data)
         frame.value = pd.to_numeric(frame.value, errors='coerce')
 
-        self.raw_data = frame.to_dict(orient='records')
-
         self.data_ = frame
         self.columns = frame.columns
         self.dtypes = frame.dtypes.items()
@@ -182,7 +188,7 @@ class Observations(Database):
         
         self.data()
         self.create_table()
-        self.upsert_async()
+        self.upsert()
 
         return True 
     
@@ -211,7 +217,9 @@ class SeriesMeta(Database):
                       'popularity', 
                       'notes']
 
-        Database.__init__(self, self.table_name, self.constraints)
+        self.upsert_mode = 'async'
+
+        Database.__init__(self, self.table_name, self.constraints, self.upsert_mode)
 
     def prep_raw(self, raw_data):
         raw_data = raw_data
@@ -248,7 +256,7 @@ class SeriesMeta(Database):
         
         self.data()
         self.create_table()
-        self.upsert_async()
+        self.upsert()
 
         return True 
     
@@ -269,7 +277,9 @@ class SeriesRelease(Database):
                       'press_release', 
                       'link']
 
-        Database.__init__(self, self.table_name, self.constraints)
+        self.upsert_mode = 'async'
+
+        Database.__init__(self, self.table_name, self.constraints, self.upsert_mode)
 
     def prep_raw(self, raw_data):
         raw_data = raw_data
@@ -298,6 +308,6 @@ class SeriesRelease(Database):
         
         self.data()
         self.create_table()
-        self.upsert_async()
+        self.upsert()
 
         return True
\ No newline at end of file
@@ -1,19 +1,27 @@
 import pandas as  pd
+from io import BytesIO
 from .admin import Database
+from . import source
+from .cache import get_cache
 
 
+#With cache=True the csv is served from the process-wide on-disk cache
 class DIX(Database):
-    def __init__(self):
+    def __init__(self, cache=False):
         self.table_name = 'dix'
         self.constraints = ['date']
+        self.url = "https://squeezemetrics.com/monitor/static/DIX.csv"
+
+        self.source = source.BaseRequests(cache=get_cache() if cache else None)
         
-        Database.__init__(self, self.table_name, self.constraints)
+        self.upsert_mode = 'async'
+
+        Database.__init__(self, self.table_name, self.constraints, self.upsert_mode)
 
     def data(self):
-        data = pd.read_csv("https://squeezemetrics.com/monitor/static/DIX.csv")
+        data = pd.read_csv(BytesIO(self.source.get_raw(self.url)))
         data['date'] = pd.to_datetime(data['date'])
         self.data_ = data
-        self.raw_data = self.data_.to_dict(orient='records')
 
         cols = list(data.columns)
 
@@ -25,6 +33,6 @@ class DIX(Database):
     def update_sequence(self):
         self.data()
         self.create_table()
-        self.upsert_async()
+        self.upsert()
 
         return True
\ No newline at end of file
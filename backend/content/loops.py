@@ -0,0 +1,50 @@
+import asyncio
+import threading
+import atexit
+
+
+#Event loop running in a daemon thread for the lifetime of the process.
+#Objects bound to a loop (asyncpg pools, aiohttp sessions) are created on it
+#once and reused by every call, instead of a fresh asyncio.run each time
+class LoopThread:
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    #Run a coroutine on the loop and block until it is done.
+    #Must not be called from a coroutine already running on this loop
+    def run(self, coro):
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        return future.result()
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=5)
+        return True
+
+
+loop_ = None
+loop_lock = threading.Lock()
+
+def get_loop():
+    global loop_
+    with loop_lock:
+        if loop_ is None:
+            loop_ = LoopThread()
+    return loop_
+
+#Function to run a coroutine on the shared background loop from synchronous code
+def run(coro):
+    return get_loop().run(coro)
+
+def stop_loop():
+    global loop_
+    with loop_lock:
+        if loop_ is not None:
+            loop_.stop()
+            loop_ = None
+    return True
+
+atexit.register(stop_loop)
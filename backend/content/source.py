@@ -1,16 +1,254 @@
 
 import requests
+from requests.adapters import HTTPAdapter
 from . import secret
+from . import loops
+from .cache import get_cache
 import aiohttp
 import asyncio
-import nest_asyncio
+import threading
+import time
+import random
+import json
+import pandas as pd
+from io import BytesIO
+import atexit
+from itertools import islice
+from urllib.parse import urlsplit
+from email.utils import parsedate_to_datetime
+
+
+#Token bucket shared by every request to one provider: at most per_minute
+#requests per minute (bursts of up to burst) and max_in_flight open at once.
+#A 429 pauses the whole bucket for the Retry-After delay.
+#Thread-safe and loop-agnostic, so sync, async and threaded callers share it
+class RateLimiter:
+
+    def __init__(self, per_minute, max_in_flight, burst=None):
+        self.rate = per_minute / 60
+        self.capacity = burst or max_in_flight
+        self.max_in_flight = max_in_flight
+
+        self.tokens = self.capacity
+        self.in_flight = 0
+        self.updated = time.monotonic()
+        self.paused_until = 0
+        self.lock = threading.Lock()
+
+    #Take a token and return the seconds to wait before it can be used
+    def reserve(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = max(0, -self.tokens / self.rate)
+            return max(wait, self.paused_until - now)
+
+    def try_enter(self):
+        with self.lock:
+            if self.in_flight < self.max_in_flight:
+                self.in_flight += 1
+                return True
+            return False
+
+    #The slot is given back if the wait for the token is interrupted
+    #(cancelled task, KeyboardInterrupt), so it never leaks
+    def acquire(self):
+        while not self.try_enter():
+            time.sleep(0.01)
+        try:
+            time.sleep(self.reserve())
+        except BaseException:
+            self.release()
+            raise
+        return True
+
+    async def async_acquire(self):
+        while not self.try_enter():
+            await asyncio.sleep(0.01)
+        try:
+            await asyncio.sleep(self.reserve())
+        except BaseException:
+            self.release()
+            raise
+        return True
+
+    def release(self):
+        with self.lock:
+            self.in_flight -= 1
+        return True
+
+    def backoff(self, seconds):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        return True
+
+
+#Function to read a Retry-After header (seconds or HTTP date)
+def retry_after_seconds(value, default=5):
+    if value is None:
+        return default
+    try:
+        return max(0, float(value))
+    except ValueError:
+        try:
+            return max(0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return default
+
+
+#Provider quotas, one limiter per provider for the whole process
+rate_limits = {'EOD': {'per_minute': 1000, 'max_in_flight': 20}, 
+               'FRED': {'per_minute': 120, 'max_in_flight': 10}}
+
+limiters = {provider: RateLimiter(**limits) for provider, limits in rate_limits.items()}
+
+
+#Process-wide HTTP sessions, created on first use and shared by every EODData/FREDData
+#object so keep-alive connections and resolved hosts survive between request batches.
+#The async session lives on the shared background loop (content/loops.py)
+http_pool = {'limit': 100, 
+             'limit_per_host': 30, 
+             'ttl_dns_cache': 300, 
+             'keepalive_timeout': 30}
+
+sync_session_ = None
+sync_session_lock = threading.Lock()
+async_session_ = None
+
+def sync_session():
+    global sync_session_
+    with sync_session_lock:
+        if sync_session_ is None:
+            adapter = HTTPAdapter(pool_connections=http_pool['limit_per_host'], 
+                                  pool_maxsize=http_pool['limit_per_host'])
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            sync_session_ = session
+    return sync_session_
+
+#Only awaited on the shared loop, so no lock is needed around the check
+async def async_session():
+    global async_session_
+    if async_session_ is None or async_session_.closed:
+        connector = aiohttp.TCPConnector(limit=http_pool['limit'], 
+                                         limit_per_host=http_pool['limit_per_host'], 
+                                         ttl_dns_cache=http_pool['ttl_dns_cache'], 
+                                         keepalive_timeout=http_pool['keepalive_timeout'])
+        async_session_ = aiohttp.ClientSession(connector=connector)
+    return async_session_
+
+def close_sessions():
+    global sync_session_, async_session_
+    if async_session_ is not None:
+        loops.run(async_session_.close())
+        async_session_ = None
+    if sync_session_ is not None:
+        sync_session_.close()
+        sync_session_ = None
+    return True
+
+atexit.register(close_sessions)
+
+
+#Per-host caps on requests in flight, shared by every batch. Only used on
+#the shared loop, like the async session
+host_semaphores = {}
+
+def host_semaphore(url):
+    host = urlsplit(url).netloc
+    if host not in host_semaphores:
+        host_semaphores[host] = asyncio.Semaphore(http_pool['limit_per_host'])
+    return host_semaphores[host]
+
+
+#Errors worth retrying: dropped connections and timeouts. HTTP errors other
+#than 429 and 5xx are raised straight away
+async_transient_errors = (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError)
+sync_transient_errors = (requests.ConnectionError, requests.Timeout)
+
+
+#orjson decodes large payloads several times faster than the stdlib decoder,
+#which stays the fallback when it is not installed
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+#Function to parse a csv body (columnar mode) into a frame with lower-case
+#column names, matching the keys of the json responses
+def decode_csv(body):
+    if len(body.strip()) == 0:
+        return pd.DataFrame()
+    frame = pd.read_csv(BytesIO(body))
+    frame.columns = frame.columns.str.lower()
+    return frame
+
+
+#Raised for HTTP error statuses that are not retried. The message has the url
+#without its parameters, so the api key never ends up in logs
+class HTTPStatusError(Exception):
+
+    def __init__(self, status, url):
+        self.status = status
+        self.url = url
+        Exception.__init__(self, f'{status} for {url}')
+
+
+#Transport sending the requests to the providers through the shared sessions.
+#A transport answers get/async_get with (status, headers, body); content/transport.py
+#has the recording, replaying and synthetic ones used for offline benchmarks
+class LiveTransport:
+
+    def get(self, url, payload, headers, timeout):
+        response = sync_session().get(url=url, params=payload, headers=headers, timeout=timeout)
+        return response.status_code, response.headers, response.content
+
+    async def async_get(self, url, payload, headers, timeout):
+        session = await async_session()
+        async with session.get(url, params=payload, headers=headers, 
+                               timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            return response.status, response.headers, await response.read()
+
+
+transport_ = LiveTransport()
+
+#Function to swap the transport of every BaseRequests object that has none of its own
+def set_transport(transport=None):
+    global transport_
+    transport_ = transport or LiveTransport()
+    return transport_
+
+def get_transport():
+    return transport_
+
+
+#Function to pull one item of an async iterator, None once it is exhausted
+async def next_item(stream):
+    try:
+        return await stream.__anext__()
+    except StopAsyncIteration:
+        return None
 
-nest_asyncio.apply()
 
 #Class to hold functions applicable to all APIs
+#cache is an optional content.cache.ResponseCache; without one every call goes to the provider.
+#transport defaults to the process-wide one (set_transport)
 class BaseRequests:
-    def __init__(self):
-        pass
+    def __init__(self, limiter=None, cache=None, transport=None):
+        if limiter is None:
+            limiter = RateLimiter(per_minute=60000, max_in_flight=100)
+        self.limiter = limiter
+        self.cache = cache
+        self.transport = transport
+        self.max_retries = 3
+        self.max_concurrent = 20
+        self.timeout = 60
+        self.backoff_base = 0.5
+        self.errors = {}
 
     #Function to build dictionary with all attributes of the payload
     def build_params(self, main_payload, adj=False,**kwargs):
@@ -27,43 +265,236 @@ class BaseRequests:
                     payload[key] = value
             return payload
         
-    #Function to make bulk api requests synchronously
+    #Exponential backoff with jitter before retry number attempt + 1
+    def backoff_delay(self, attempt):
+        return self.backoff_base * 2 ** attempt * (1 + random.random())
+
+    #Cache key and stored entry of a request, (None, None) when it is not cacheable
+    def cache_lookup(self, url, payload):
+        if self.cache is None or self.cache.ttl(url) is None:
+            return None, None
+        key = self.cache.key(url, payload)
+        return key, self.cache.get(key)
+
+    #Responses are fetched as raw bytes (cached as such) and decoded afterwards.
+    #Requests made with fmt=csv (columnar mode) are parsed straight into a frame
+    #of columns, without a dict per row
+    def decode(self, body, payload=None):
+        if payload is not None and payload.get('fmt') == 'csv':
+            return decode_csv(body)
+        return json_loads(body)
+
+    def sync_fetch_data(self, url, payload):
+        return self.decode(self.sync_fetch_body(url, payload), payload)
+
+    #Function to make one request through the rate limiter. 429 waits for
+    #Retry-After, 5xx and dropped connections or timeouts back off exponentially.
+    #A fresh cache entry is returned without a request, a stale one is revalidated
+    def sync_fetch_body(self, url, payload):
+        transport = self.transport or get_transport()
+        key, entry = self.cache_lookup(url, payload)
+        headers = {}
+        if entry is not None:
+            if self.cache.is_fresh(entry, url):
+                return entry['body']
+            headers = self.cache.conditional_headers(entry)
+
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            try:
+                status, response_headers, body = transport.get(url, payload, headers, self.timeout)
+            except sync_transient_errors:
+                if attempt == self.max_retries:
+                    raise
+                status = None
+            finally:
+                self.limiter.release()
+
+            if status is None:
+                time.sleep(self.backoff_delay(attempt))
+                continue
+            if status == 429 and attempt < self.max_retries:
+                self.limiter.backoff(retry_after_seconds(response_headers.get('Retry-After')))
+                continue
+            if status >= 500 and attempt < self.max_retries:
+                time.sleep(self.backoff_delay(attempt))
+                continue
+            if status == 304 and entry is not None:
+                self.cache.touch(key, entry)
+                return entry['body']
+            if status >= 400:
+                raise HTTPStatusError(status, url)
+            if key is not None:
+                self.cache.put(key, body, response_headers)
+            return body
+
+    #Function to read any url (no api parameters) through the transport, limiter and cache
+    def get_raw(self, url, payload=None):
+        return self.sync_fetch_body(url, payload)
+
+    #Function to make bulk api requests synchronously. Failed keys go to the
+    #error map instead of stopping the batch
     def sync_request(self, params:dict):
-        with requests.Session() as session:
-            dic = {}
-            for symbol in params:
-                url, payload = params[symbol]
-                dic[symbol] = session.get(url = url, params=payload).json()
-            return dic 
+        dic = {}
+        errors = {}
+        for symbol in params:
+            url, payload = params[symbol]
+            try:
+                dic[symbol] = self.sync_fetch_data(url, payload)
+            except Exception as error:
+                errors[symbol] = error
+        return dic, errors
     
-    #Function to assemble api requests asynchronously
-    async def async_fetch_data(self, session, url, payload):
-        async with session.get(url, params=payload) as response:
-            return await response.json()
+    async def async_fetch_data(self, url, payload):
+        return self.decode(await self.async_fetch_body(url, payload), payload)
+
+    #Function to assemble api requests asynchronously, same retry and cache policy as sync_fetch_body
+    async def async_fetch_body(self, url, payload):
+        transport = self.transport or get_transport()
+        key, entry = self.cache_lookup(url, payload)
+        headers = {}
+        if entry is not None:
+            if self.cache.is_fresh(entry, url):
+                return entry['body']
+            headers = self.cache.conditional_headers(entry)
+
+        for attempt in range(self.max_retries + 1):
+            entered = False
+            try:
+                await self.limiter.async_acquire()
+                entered = True
+                status, response_headers, body = await transport.async_get(url, payload, headers, self.timeout)
+                if status == 429 and attempt < self.max_retries:
+                    self.limiter.backoff(retry_after_seconds(response_headers.get('Retry-After')))
+                    continue
+                if status == 304 and entry is not None:
+                    self.cache.touch(key, entry)
+                    return entry['body']
+                if status < 500 or attempt == self.max_retries:
+                    if status >= 400:
+                        raise HTTPStatusError(status, url)
+                    if key is not None:
+                        self.cache.put(key, body, response_headers)
+                    return body
+            except async_transient_errors:
+                if attempt == self.max_retries:
+                    raise
+            finally:
+                if entered is True:
+                    self.limiter.release()
+            await asyncio.sleep(self.backoff_delay(attempt))
         
-    #Function to make bulk api requests asynchronously
-    async def async_setup(self, params:dict):
-        async with aiohttp.ClientSession() as session:
-            tasks=[]
-            for key in params:
-                url, payload = params[key]
-                tasks.append(self.async_fetch_data(session, url, payload))
-            
-            responses = await asyncio.gather(*tasks)
-            return dict(zip(params.keys(), responses))
+    #Function to fetch once a slot of the batch and of the host are free
+    async def async_bounded_fetch(self, semaphore, url, payload):
+        async with semaphore, host_semaphore(url):
+            return await self.async_fetch_data(url, payload)
+
+    #Function to make bulk api requests asynchronously, with at most max_concurrent
+    #requests of the batch in flight. Returns the responses that succeeded and
+    #an error map for the keys that failed
+    async def async_setup(self, params:dict, max_concurrent=None):
+        semaphore = asyncio.Semaphore(max_concurrent or self.max_concurrent)
+        tasks=[]
+        for key in params:
+            url, payload = params[key]
+            tasks.append(self.async_bounded_fetch(semaphore, url, payload))
         
+        responses = await asyncio.gather(*tasks, return_exceptions=True)
 
-    def select_request(self, params, asyn=True):
+        dic = {}
+        errors = {}
+        for key, response in zip(params.keys(), responses):
+            if isinstance(response, BaseException):
+                errors[key] = response
+            else:
+                dic[key] = response
+        return dic, errors
+        
+    #Function to yield (key, payload) as each response lands. At most max_concurrent
+    #requests are in flight or waiting to be consumed: a new one is only sent when
+    #a finished one is taken, so a slow consumer holds back the downloads.
+    #Failed keys go to self.errors
+    async def async_stream(self, params:dict, max_concurrent=None):
+        window = max_concurrent or self.max_concurrent
+        semaphore = asyncio.Semaphore(window)
+        keys = iter(params)
+        pending = {}
+        self.errors = {}
+
+        try:
+            while True:
+                for key in islice(keys, window - len(pending)):
+                    url, payload = params[key]
+                    task = asyncio.ensure_future(self.async_bounded_fetch(semaphore, url, payload))
+                    pending[task] = key
+                if len(pending) == 0:
+                    break
+
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    key = pending.pop(task)
+                    if task.exception() is not None:
+                        self.errors[key] = task.exception()
+                    else:
+                        yield key, task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    #Synchronous generator over the same stream, pulled item by item from the shared loop
+    def stream_request(self, params, asyn=True, max_concurrent=None):
+        received = 0
+        if asyn == True:
+            stream = self.async_stream(params, max_concurrent=max_concurrent)
+            try:
+                while True:
+                    item = loops.run(next_item(stream))
+                    if item is None:
+                        break
+                    received += 1
+                    yield item
+            finally:
+                loops.run(stream.aclose())
+        else:
+            self.errors = {}
+            for key in params:
+                url, payload = params[key]
+                try:
+                    payload = self.sync_fetch_data(url, payload)
+                except Exception as error:
+                    self.errors[key] = error
+                    continue
+                received += 1
+                yield key, payload
+
+        self.check_errors(self.errors, len(params), received)
+
+    #Only the error types are printed, the messages carry the api key in the url.
+    #If every request failed the first error is raised
+    def check_errors(self, errors, requested, received):
+        if len(errors) > 0:
+            print(f'{len(errors)} of {requested} requests failed: ' + 
+                  ', '.join([f'{key}: {type(error).__name__}' for key, error in list(errors.items())[:5]]))
+            if received == 0:
+                raise next(iter(errors.values()))
+        return True
+
+    #Partial results are returned with the failures in self.errors
+    def select_request(self, params, asyn=True, max_concurrent=None):
         if asyn == True:
-            responses = asyncio.run(self.async_setup(params))
+            responses, errors = loops.run(self.async_setup(params, max_concurrent=max_concurrent))
         else:
-            responses = self.sync_request(params)
+            responses, errors = self.sync_request(params)
+
+        self.errors = errors
+        self.check_errors(errors, len(params), len(responses))
         return responses                 
     
 #End of day Data API wrapper
+#With cache=True responses are served from the process-wide on-disk cache
 class EODData(BaseRequests):
 
-    def __init__(self):
+    def __init__(self, cache=False):
         self.api_key = secret.key_chain['EOD']
         self.main_url = 'https://eodhd.com/api'
         self.main_params = {
@@ -71,29 +502,43 @@ class EODData(BaseRequests):
                     'fmt': 'json'
                             }
     
-        BaseRequests.__init__(self)
+        BaseRequests.__init__(self, limiters['EOD'], get_cache() if cache else None)
 
     #Pair of functions to request data from the EOD endpoint
     #Function that builds dictionary of parameters for the api requests to the EOD endpoint
-    def historical_params(self, symbols:list, **kwargs):
+    #from_dates optionally maps symbols to their own start date
+    def historical_params(self, symbols:list, from_dates:dict=None, **kwargs):
 
         main_url = self.main_url
         endpoint = '/eod'
         
         dic = {}
         for symbol in symbols:
-            payload = self.build_params(self.main_params, **kwargs)
+            payload = self.build_params(self.main_params, adj=True, **kwargs)
+            if from_dates is not None and symbol in from_dates:
+                payload['from'] = from_dates[symbol]
             url = main_url + endpoint + '/' + symbol
             dic[symbol] = (url, payload)
 
         return dic
     
-    #Function to make calls to the EOD endpoint
-    def historical(self, symbols:list, asyn=True ,**kwargs):
-        params = self.historical_params(symbols, **kwargs)
+    #Function to make calls to the EOD endpoint. With columnar=True the bars
+    #of each symbol come back as a frame (csv format) instead of a list of dicts
+    def historical(self, symbols:list, asyn=True, from_dates:dict=None, columnar=False, **kwargs):
+        if columnar == True:
+            kwargs['fmt'] = 'csv'
+        params = self.historical_params(symbols, from_dates=from_dates, **kwargs)
         responses = self.select_request(params, asyn=asyn)
         return responses
 
+    #Same requests as historical, yielding (symbol, bars) as each response lands
+    def historical_stream(self, symbols:list, asyn=True, from_dates:dict=None, max_concurrent=None, 
+                          columnar=False, **kwargs):
+        if columnar == True:
+            kwargs['fmt'] = 'csv'
+        params = self.historical_params(symbols, from_dates=from_dates, **kwargs)
+        return self.stream_request(params, asyn=asyn, max_concurrent=max_concurrent)
+
     #Functions to retrieve quotes for stocks, indices and ETFs
     def intraday_params(self, symbols:list, **kwargs):
         
@@ -106,11 +551,53 @@ class EODData(BaseRequests):
         dic = {'intraday': (url, payload)}
         return dic
     
-    def intraday(self, symbols:list, asyn=True, **kwargs):
+    def intraday(self, symbols:list, asyn=True, columnar=False, **kwargs):
+        if columnar == True:
+            kwargs['fmt'] = 'csv'
         params = self.intraday_params(symbols, **kwargs)
         responses = self.select_request(params, asyn=asyn)
         return responses['intraday']
 
+    #Functions to retrieve intraday bars for many (symbol, from, to) windows in one batch
+    def intraday_windows_params(self, windows:list, **kwargs):
+
+        main_url = self.main_url
+        endpoint = '/intraday'
+
+        dic = {}
+        for symbol, from_date, to_date in windows:
+            payload = self.build_params(self.main_params, adj=True, from_date=from_date, to=to_date, **kwargs)
+            url = main_url + endpoint + '/' + symbol
+            dic[(symbol, from_date, to_date)] = (url, payload)
+
+        return dic
+
+    def intraday_windows(self, windows:list, asyn=True, max_concurrent=None, columnar=False, **kwargs):
+        if columnar == True:
+            kwargs['fmt'] = 'csv'
+        params = self.intraday_windows_params(windows, **kwargs)
+        responses = self.select_request(params, asyn=asyn, max_concurrent=max_concurrent)
+        return responses
+
+    #Functions to retrieve the last trading day of whole exchanges, one request per exchange
+    def bulk_last_day_params(self, exchanges:list, **kwargs):
+
+        main_url = self.main_url
+        endpoint = '/eod-bulk-last-day'
+
+        dic = {}
+        for exchange in exchanges:
+            payload = self.build_params(self.main_params, **kwargs)
+            url = main_url + endpoint + '/' + exchange
+            dic[exchange] = (url, payload)
+
+        return dic
+
+    def bulk_last_day(self, exchanges:list, asyn=True, **kwargs):
+        params = self.bulk_last_day_params(exchanges, **kwargs)
+        responses = self.select_request(params, asyn=asyn)
+        return responses
+
     #Function to retrieve tickers from a specified exchange
     def tickers_params(self, exchange:str='US', **kwargs):
 
@@ -248,7 +735,7 @@ class EODData(BaseRequests):
 #Fred Data API wrapper
 class FREDData(BaseRequests):
 
-    def __init__(self):
+    def __init__(self, cache=False):
         self.api_key = secret.key_chain['FRED']
         self.main_url = 'https://api.stlouisfed.org/fred'
         self.main_params = {
@@ -256,7 +743,7 @@ class FREDData(BaseRequests):
                     'file_type': 'json'
                             }
     
-        BaseRequests.__init__(self)
+        BaseRequests.__init__(self, limiters['FRED'], get_cache() if cache else None)
 
     #Pair of functions to request data from the FRED endpoint
     #Function that builds dictionary of parameters for the api requests to the EOD endpoint
@@ -319,6 +806,11 @@ class FREDData(BaseRequests):
         params = self.observ_params(series_ids, **kwargs)
         responses = self.select_request(params, asyn=asyn)
         return responses
+
+    #Same requests as observ, yielding (series_id, payload) as each response lands
+    def observ_stream(self, series_ids:list, asyn=True, **kwargs):
+        params = self.observ_params(series_ids, **kwargs)
+        return self.stream_request(params, asyn=asyn)
     
     def series_meta_params(self, series_ids:list, **kwargs):
 
@@ -0,0 +1,184 @@
+import os
+import gzip
+import time
+import zlib
+import random
+import asyncio
+import threading
+import numpy as np
+import pandas as pd
+from urllib.parse import urlsplit
+from .source import LiveTransport
+from .cache import request_key
+
+
+#Transports for offline runs of the ingestion classes. Any of them can be set
+#process-wide with source.set_transport, e.g. to benchmark update_sequence:
+#   source.set_transport(transport.SyntheticTransport(latency=0.05))
+#   eod.Historical(symbols).update_sequence()
+
+default_store = os.path.join(os.path.expanduser('~'), '.cache', 'ecovol', 'recordings')
+
+
+#Transport passing requests to inner (live by default) and writing every
+#successful response to a gzip file per request, keyed like the response cache
+class RecordTransport:
+
+    def __init__(self, directory=None, inner=None):
+        self.directory = directory or os.environ.get('ECOVOL_RECORDINGS', default_store)
+        self.inner = inner or LiveTransport()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, url, payload):
+        return os.path.join(self.directory, request_key(url, payload) + '.gz')
+
+    def record(self, url, payload, status, body):
+        if status != 200:
+            return False
+        path = self.path(url, payload)
+        temp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with gzip.open(temp, 'wb') as f:
+            f.write(body)
+        os.replace(temp, path)
+        return True
+
+    def get(self, url, payload, headers, timeout):
+        status, response_headers, body = self.inner.get(url, payload, headers, timeout)
+        self.record(url, payload, status, body)
+        return status, response_headers, body
+
+    async def async_get(self, url, payload, headers, timeout):
+        status, response_headers, body = await self.inner.async_get(url, payload, headers, timeout)
+        self.record(url, payload, status, body)
+        return status, response_headers, body
+
+
+#Base of the offline transports: every response takes latency seconds plus a
+#uniform jitter, then comes from respond(url, payload)
+class SimulatedTransport:
+
+    def __init__(self, latency=0.0, jitter=0.0):
+        self.latency = latency
+        self.jitter = jitter
+
+    def delay(self):
+        return self.latency + random.random() * self.jitter
+
+    def get(self, url, payload, headers, timeout):
+        time.sleep(self.delay())
+        return self.respond(url, payload or {})
+
+    #Responses are generated in a worker thread, so the simulated server does
+    #not hold up the client's event loop
+    async def async_get(self, url, payload, headers, timeout):
+        await asyncio.sleep(self.delay())
+        return await asyncio.get_running_loop().run_in_executor(None, self.respond, url, payload or {})
+
+
+#Transport answering from a RecordTransport store, 404 for requests never recorded
+class ReplayTransport(SimulatedTransport):
+
+    def __init__(self, directory=None, latency=0.0, jitter=0.0):
+        self.directory = directory or os.environ.get('ECOVOL_RECORDINGS', default_store)
+        SimulatedTransport.__init__(self, latency, jitter)
+
+    def respond(self, url, payload):
+        path = os.path.join(self.directory, request_key(url, payload) + '.gz')
+        try:
+            with gzip.open(path, 'rb') as f:
+                return 200, {}, f.read()
+        except FileNotFoundError:
+            return 404, {}, b''
+
+
+#Transport generating random-walk responses shaped like the EOD, FRED and DIX
+#ones, for symbol universes of any size. Each series is seeded by its symbol,
+#so repeated runs return the same data. rows is the number of daily bars of a
+#full history; universe the number of codes in a bulk last-day response
+class SyntheticTransport(SimulatedTransport):
+
+    def __init__(self, rows=2500, universe=5000, latency=0.0, jitter=0.0):
+        self.rows = rows
+        self.universe = universe
+        self.end = pd.Timestamp.today().normalize()
+
+        #Business days of a full history, built once (bdate_range is slow)
+        self.days = pd.bdate_range(end=self.end, periods=rows)
+        self.day_strings = self.days.strftime('%Y-%m-%d')
+        SimulatedTransport.__init__(self, latency, jitter)
+
+    def walk(self, name, size, start=100):
+        rng = np.random.default_rng(zlib.crc32(name.encode()))
+        return (start + rng.normal(0, 1, size).cumsum()).round(4)
+
+    #Bodies are serialized with DataFrame.to_json, fast enough that generating
+    #a response costs far less than the simulated latency
+    def respond(self, url, payload):
+        path = urlsplit(url).path
+        name = path.split('/')[-1]
+
+        if '/eod-bulk-last-day/' in path:
+            body = self.bulk(name).to_json(orient='records')
+        elif '/eod/' in path:
+            body = self.bars(self.daily(name, payload.get('from')), payload)
+        elif '/intraday/' in path:
+            body = self.bars(self.intraday(name, payload.get('from'), payload.get('to')), payload)
+        elif path.endswith('/series/observations'):
+            body = '{"observations": ' + self.observations(payload.get('series_id')).to_json(orient='records') + '}'
+        elif path.endswith('DIX.csv'):
+            body = self.dix().to_csv(index=False)
+        else:
+            return 404, {}, b''
+
+        return 200, {}, body.encode()
+
+    #Bars as json records, or as csv with capitalized headers like EOD's when fmt=csv
+    def bars(self, frame, payload):
+        if payload.get('fmt') == 'csv':
+            frame = frame.rename(columns=str.capitalize)
+            return frame.to_csv(index=False)
+        return frame.to_json(orient='records')
+
+    def daily(self, symbol, from_date=None):
+        close = self.walk(symbol, self.rows)
+        volume = np.random.default_rng(self.rows).integers(1000, 10**7, self.rows)
+        frame = pd.DataFrame({'date': self.day_strings, 'open': close, 'high': close, 'low': close, 
+                              'close': close, 'adjusted_close': close, 'volume': volume})
+        if from_date is not None:
+            frame = frame[self.days >= pd.Timestamp(from_date)]
+        return frame
+
+    #One bar per minute of the regular session (14:30-21:00 UTC) between the unix timestamps
+    def intraday(self, symbol, from_ts, to_ts):
+        minutes = pd.date_range(start=pd.Timestamp(int(from_ts), unit='s'),
+                                end=pd.Timestamp(int(to_ts), unit='s'), freq='min')
+        minute_of_day = minutes.hour * 60 + minutes.minute
+        minutes = minutes[(minutes.dayofweek < 5) & (minute_of_day >= 870) & (minute_of_day < 1260)]
+        close = self.walk(symbol + str(from_ts), len(minutes), start=400)
+
+        return pd.DataFrame({'timestamp': (minutes - pd.Timestamp(0)) // pd.Timedelta(seconds=1),
+                             'gmtoffset': 0, 
+                             'datetime': minutes.strftime('%Y-%m-%d %H:%M:%S'),
+                             'open': close, 'high': close, 'low': close, 'close': close, 'volume': 1000})
+
+    def bulk(self, exchange):
+        day = self.day_strings[-1]
+        codes = ['SPY', 'QQQ', 'TLT', 'HYG', 'VIX', 'VIX9D', 'VIX3M', 'VVIX', 'SKEW']
+        codes = codes + [f'SYM{i}' for i in range(self.universe - len(codes))]
+        close = self.walk(exchange, len(codes))
+        return pd.DataFrame({'code': codes, 'exchange_short_name': exchange, 'date': day,
+                             'open': close, 'high': close, 'low': close, 'close': close, 
+                             'adjusted_close': close, 'volume': 1000})
+
+    #FRED sends the values as strings
+    def observations(self, series_id):
+        dates = self.day_strings
+        values = self.walk(series_id, self.rows, start=5)
+        return pd.DataFrame({'realtime_start': dates, 'realtime_end': dates, 'date': dates, 
+                             'value': values.astype(str)})
+
+    def dix(self):
+        return pd.DataFrame({'date': self.day_strings,
+                             'price': self.walk('price', self.rows, start=400),
+                             'dix': 0.4 + self.walk('dix', self.rows, start=0) / 1000,
+                             'gex': self.walk('gex', self.rows, start=0) * 10**8})
@@ -1,33 +1,17 @@
 import pandas as pd
 from content import source
-from zoneinfo import ZoneInfo
 import matplotlib.pyplot as plt
 import numpy as np
-from datetime import date, datetime, timezone
+from datetime import date, datetime
 from matplotlib.figure import Figure
 from content import admin
+from rolling import rolling_autocorr
 
 plt.style.use('seaborn-v0_8-darkgrid')
 plt.rcParams.update({'font.size': 8})
 
-#Function to convert date to UTC unix timestamp
-def date_convert_in(date_str:str):
-    dt_est = datetime.fromisoformat(date_str)
-    dt_est = dt_est.replace(tzinfo=ZoneInfo("America/New_York"))
-    dt_utc = dt_est.astimezone(ZoneInfo("UTC"))
-    unix_timestamp = int(dt_utc.timestamp())
-    print(dt_utc.strftime("%Y-%m-%d %H:%M:%S.%f"), unix_timestamp)
-    return unix_timestamp
-
-#Function to convert UTC unix timestamp into EST datetime format
-def date_convert_out(unix_timestamp: int):
-    dt_utc = datetime.fromtimestamp(unix_timestamp, tz=timezone.utc)
-    dt_est = dt_utc.astimezone(ZoneInfo("America/New_York"))
-   
-    return pd.to_datetime(dt_est)
-
 def get_series(symbol, from_date='2025-01-01'):
-    obj = source.EODData()
+    obj = source.EODData(cache=True)
     resp = obj.historical([symbol], from_date=from_date)[symbol]
     frame = pd.DataFrame(resp)
     return frame 
@@ -172,7 +156,7 @@ class VolSpread:
         #to_date = date_convert_in(now_str)
         #data = obj.intraday([self.symbol], interval="1m" ,from_date=from_date, to=to_date)
         #frame = pd.DataFrame(data)
-        #frame['datetime'] = [date_convert_out(x) for x in frame.timestamp]
+        #frame['datetime'] = dates_convert_out(frame.timestamp)
         #frame.set_index('datetime', inplace=True)
         #return frame[['close','open', 'high', 'low', 'volume']]
         pass
@@ -354,8 +338,7 @@ class AutoCorrVol:
     def indicator(self):            
         vol = self.actual_vol()
         spy_data = self.get_spy_data()
-        rolling_autocorr  = vol.rolling(window=self.max_lag).apply(lambda x: x.autocorr(lag=1))
-        self.indicator_data = rolling_autocorr
+        self.indicator_data = rolling_autocorr(vol, self.max_lag)
         self.indicator_data = self.indicator_data.merge(spy_data[['close']], left_index=True, right_index=True, how='left')
         self.indicator_data.loc[self.indicator_data['ann_vol']>self.upper, 'signal'] = 0
         self.indicator_data.loc[self.indicator_data['ann_vol']<self.lower, 'signal'] = -1
@@ -1,3 +1,4 @@
+import copy
 import pandas as pd
 from content import source
 from zoneinfo import ZoneInfo
@@ -6,8 +7,11 @@ import numpy as np
 from datetime import date, datetime, timezone
 from matplotlib.figure import Figure
 from content import admin
+from sqlalchemy import text
+from concurrent.futures import ThreadPoolExecutor
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
+from rolling import rolling_autocorr, rolling_zscore, rolling_corr, RollingWindow
 
 
 
@@ -32,11 +36,25 @@ class Data:
             return True
         else:
             return False
+
+    #Engine from the process-wide pool in admin
+    def engine(self):
+        return admin.Database('', []).engine()
+
+    #Left-merge the columns of a frame that are not loaded yet
+    def append_data(self, data):
+        if self.check_data() is True:
+            cols = [col for col in data.columns if col not in self.data.columns]
+            self.data = self.data.merge(data[cols], how='left', left_index=True, right_index=True)
+        else:
+            self.data = data
+
+        return self.data
     
     #Pull raw historical data from loaded database
     def get_historical(self, symbol, driver='close', append=True):
 
-        with admin.Database('', []).engine().connect() as conn:
+        with self.engine().connect() as conn:
             query = f'''SELECT date, {driver} FROM historical WHERE symbol = '{symbol}' 
                         AND date > '{self.from_date}'
                         ORDER BY date;'''
@@ -56,10 +74,32 @@ class Data:
 
         return data
 
+    #Pull several historical symbols in one query, pivoted to one column per symbol.
+    #The dates of the first symbol index the frame, as with successive left merges
+    def get_historical_batch(self, symbols:list, driver='close', append=True):
+
+        with self.engine().connect() as conn:
+            query = text(f'''SELECT date, symbol, {driver} FROM historical WHERE symbol = ANY(:symbols)
+                        AND date > :from_date
+                        ORDER BY date;''')
+            data = pd.read_sql(query, conn, params={'symbols': list(symbols), 'from_date': self.from_date})
+
+        data['date'] = pd.to_datetime(data['date'])
+        dates = pd.Index(data.loc[data['symbol'] == symbols[0], 'date'], name='date')
+
+        data = data.pivot(index='date', columns='symbol', values=driver)
+        data = data.reindex(index=dates, columns=symbols)
+        data.columns.name = None
+
+        if append is True:
+            self.append_data(data)
+
+        return data
+
     #Pull raw historical data from loaded database
     def get_econ_historical(self, id, append=True):
 
-        with admin.Database('', []).engine().connect() as conn:
+        with self.engine().connect() as conn:
             query = f'''SELECT date, value FROM econ_hist WHERE id = '{id}' 
                         AND date > '{self.from_date}'
                         ORDER BY date;'''
@@ -88,7 +128,7 @@ class Data:
         query = f'''SELECT datetime, close FROM intraday WHERE symbol ='{symbol}'
                     AND datetime > '{self.from_date}';'''
         
-        with admin.Database('', []).engine().connect() as conn:
+        with self.engine().connect() as conn:
             data = pd.read_sql(query, conn)
 
         data['returns'] = data['close'].pct_change()
@@ -114,7 +154,7 @@ class Data:
     
     def get_gex(self, append=True):
         symbol='gex'
-        with admin.Database('', []).engine().connect() as conn:
+        with self.engine().connect() as conn:
             query = f'''SELECT date, {symbol} FROM dix WHERE date > '{self.from_date}';'''
             data = pd.read_sql(query, conn)
         
@@ -133,21 +173,115 @@ class Data:
         return data
 
     
+    #Historical symbols are read in one query and the independent econ, intraday
+    #and dix reads run concurrently on the pooled engine, then everything is
+    #merged in the same order as loading them one by one
     def load_data(self):
-        self.get_historical(self.benchmark)
-        self.get_historical('VIX.INDX')
-        self.get_historical('VVIX.INDX')
-        self.get_historical('VIX1D.INDX')
-        self.get_historical('SKEW.INDX')
-        self.get_historical('VIX9D.INDX')
-        self.get_historical('VIX3M.INDX')
-        self.get_historical('MOVE.INDX')
-        self.get_econ_historical('DTB3')
-        self.get_econ_historical('SOFR90DAYAVG')
-        self.volatility()
-        self.get_gex()
+        symbols = [self.benchmark, 
+                   'VIX.INDX', 
+                   'VVIX.INDX', 
+                   'VIX1D.INDX', 
+                   'SKEW.INDX', 
+                   'VIX9D.INDX', 
+                   'VIX3M.INDX', 
+                   'MOVE.INDX']
+
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            futures = [executor.submit(self.get_historical_batch, symbols, append=False), 
+                       executor.submit(self.get_econ_historical, 'DTB3', append=False), 
+                       executor.submit(self.get_econ_historical, 'SOFR90DAYAVG', append=False), 
+                       executor.submit(self.volatility, append=False), 
+                       executor.submit(self.get_gex, append=False)]
+
+            for future in futures:
+                self.append_data(future.result())
+
+        return True
+
+
+#Function to put the rows passed to update (a list of frames, in order) at the
+#end of the market data. Rows from the first new date on are replaced, so a
+#fresher copy of today's bar overwrites the old one
+def append_rows(data, pending_rows):
+    new_rows = pd.concat(pending_rows)
+    new_rows = new_rows[~new_rows.index.duplicated(keep='last')]
+    start = new_rows.index.min()
+    return pd.concat([data.iloc[:data.index.searchsorted(start)], new_rows])
+
+
+#Growable block of float rows behind the frames of an incrementally updated
+#model: rows are written in place (the block doubles when full) and the frames
+#handed out are views of it, so a new row never copies the history. Rows a
+#view already shows are never written again: replacing one (a fresher copy of
+#the last date) first copies the block, so frames handed out earlier keep
+#their values
+class FrameBuffer:
+
+    def __init__(self, frame):
+        self.columns = list(frame.columns)
+        self.column_index = pd.Index(self.columns)
+        self.renamed = {}
+        self.index_name = frame.index.name
+        self.size = len(frame)
+
+        capacity = max(2 * self.size, 64)
+        self.values = np.full((capacity, len(self.columns)), np.nan)
+        self.values[:self.size] = frame.to_numpy(dtype=float)
+        self.dates = np.empty(capacity, dtype=frame.index.dtype)
+        self.dates[:self.size] = frame.index.to_numpy()
+
+        #Rows seen by the views handed out
+        self.exposed = 0
+
+    #Function to write the row of a date after the last one. A last row with
+    #the same date is dropped first; row None only drops it. Rows with missing
+    #values are left out when dropna is True, as with DataFrame.dropna
+    def put(self, day, row, dropna=True):
+        day = pd.Timestamp(day).to_datetime64()
+        if self.size > 0 and self.dates[self.size - 1] == day:
+            self.size -= 1
+        if row is None or (dropna is True and np.isnan(row).any()):
+            return False
+
+        if self.size == len(self.values):
+            self.values = np.concatenate([self.values, np.full_like(self.values, np.nan)])
+            self.dates = np.concatenate([self.dates, np.empty_like(self.dates)])
+            self.exposed = 0
+        elif self.size < self.exposed:
+            self.values = self.values.copy()
+            self.dates = self.dates.copy()
+            self.exposed = 0
+        self.values[self.size] = row
+        self.dates[self.size] = day
+        self.size += 1
         return True
 
+    #Value of column on a date, NaN if there is no row for it
+    def get(self, day, column):
+        day = pd.Timestamp(day).to_datetime64()
+        position = np.searchsorted(self.dates[:self.size], day)
+        if position < self.size and self.dates[position] == day:
+            return self.values[position, self.columns.index(column)]
+        return np.nan
+
+    def index(self):
+        self.exposed = max(self.exposed, self.size)
+        return pd.DatetimeIndex(self.dates[:self.size], name=self.index_name)
+
+    #Frame of the rows on index (from index()) as a view of the block
+    def frame(self, index):
+        self.exposed = max(self.exposed, self.size)
+        return pd.DataFrame(self.values[:self.size], index=index, columns=self.column_index, copy=False)
+
+    #Frame of one column, renamed name
+    def column_frame(self, index, column, name):
+        self.exposed = max(self.exposed, self.size)
+        if name not in self.renamed:
+            self.renamed[name] = pd.Index([name])
+        position = self.columns.index(column)
+        return pd.DataFrame(self.values[:self.size, position:position + 1], index=index, 
+                            columns=self.renamed[name], copy=False)
+
 
 #Model administration class
 class ModelAdmin:
@@ -158,6 +292,13 @@ class ModelAdmin:
         #Plot parameters
         self.view_ratios = [2, 0.5, 0.5]
         self.color_map = {-1:'red', 1:'green', 0:'yellow'}
+
+        #Incremental updates: rows passed to update and not merged into the
+        #market data yet (merged every pending_limit updates or before a full
+        #recompute), and the rolling windows of the model
+        self.pending_rows = []
+        self.pending_limit = 64
+        self.state = None
     
     def api(self):
         if hasattr(self, 'model_data'):
@@ -307,6 +448,196 @@ class ModelAdmin:
             setattr(self, key, value)
         return self
 
+    #A model is dirty when it has never been computed or when any of its
+    #params changed since the last computation
+    def is_dirty(self):
+        if not hasattr(self, 'model_data'):
+            return True
+        return getattr(self, 'clean_params', None) != self.to_dict()
+
+    #Recompute the model only if it is dirty, returns True when it was recomputed
+    def refresh(self):
+        if self.is_dirty() is True:
+            return self.recompute()
+        return False
+
+    #Full recompute on the market data with the pending rows merged in
+    def recompute(self):
+        self.flush_rows()
+        self.indicator()
+        self.clean_params = self.to_dict()
+        self.state = None
+        return True
+
+    def flush_rows(self):
+        if len(self.pending_rows) > 0:
+            self.data = append_rows(self.data, self.pending_rows)
+            self.pending_rows = []
+        return True
+
+    #Name of the rolling window param of the model, None for pointwise models
+    def window_param(self):
+        if hasattr(self, 'avg_window'):
+            return 'avg_window'
+        return None
+
+    #Rows the feature of a date depends on (that date included): the rolling
+    #window for windowed models, 1 for pointwise ones
+    def lookback(self):
+        param = self.window_param()
+        if param is None:
+            return 1
+        return getattr(self, param)
+
+    #Signal of one feature value, same rule as the thresholds of indicator()
+    #(lower wins when they overlap)
+    def row_signal(self, value):
+        if value < self.lower:
+            return self.below_low
+        if value > self.upper:
+            return self.above_up
+        return self.other
+
+    #Rolling window name of the incremental state, with the value of the
+    #current date pushed (or replaced, for a fresher copy of the last date)
+    def roll(self, name, value, window):
+        if name not in self.state:
+            self.state[name] = RollingWindow(window)
+        return self.state[name].push(value, self.replacing)
+
+    #The state is current while model_data is still the frame update left
+    #(a full recompute replaces it)
+    def state_is_current(self):
+        return self.state is not None and self.model_data is self.state_frame
+
+    #Rebuild the state of the incremental updates: the rolling windows from the
+    #last lookback rows of the market data, and model_data moved to a buffer
+    def start_updates(self):
+        self.flush_rows()
+        self.state = {}
+        self.replacing = False
+        for day, row in self.data.iloc[-self.lookback():].iterrows():
+            self.step(row)
+
+        self.data_end = self.data.index[-1]
+        self.buffer = FrameBuffer(self.model_data)
+        return self.set_buffer_frames()
+
+    def set_buffer_frames(self):
+        index = self.buffer.index()
+        self.model_data = self.buffer.frame(index)
+        self.signal = self.buffer.column_frame(index, 'SIGNAL', self.code)
+        self.state_frame = self.model_data
+
+        self.last_stats = self.model_data.iloc[-1]
+        self.last_update = self.model_data.index[-1]
+        return self.model_data
+
+    #Incremental update with new rows of market data (e.g. today's bar): each
+    #row goes through the rolling windows of the model (step) and is written
+    #in place at the end of model_data and signal, O(window) per row whatever
+    #the length of the history. A row with the date of the last one replaces it.
+    #A dirty model, or rows older than the last date, are recomputed in full,
+    #returns True in that case. Frames handed out before are left as they were
+    def update(self, new_rows):
+        if self.is_dirty() is False and self.state_is_current() is False:
+            self.start_updates()
+
+        self.pending_rows.append(new_rows)
+        if self.is_dirty() is True or new_rows.index.min() < self.data_end:
+            return self.recompute()
+
+        if not new_rows.columns.equals(self.data.columns):
+            new_rows = new_rows.reindex(columns=self.data.columns)
+        for day, row in new_rows.iterrows():
+            self.replacing = day == self.data_end
+            values = self.step(row)
+            values['SIGNAL'] = self.row_signal(values[self.feature])
+            self.buffer.put(day, [values[column] for column in self.buffer.columns])
+            self.data_end = day
+        self.set_buffer_frames()
+
+        if len(self.pending_rows) >= self.pending_limit:
+            self.flush_rows()
+        return False
+
+    #Model data of a copy of the model with the window param set to window,
+    #the model itself is left untouched
+    def window_data(self, window=None):
+        model = copy.copy(self)
+        if window is not None:
+            setattr(model, self.window_param(), window)
+        return model.indicator()
+
+    #Parameter sweep: the signal of every combination of windows, uppers and
+    #lowers without running indicator() per combination. The feature is
+    #computed once per window and the thresholds are applied to all of them
+    #in one broadcasted comparison. Returns a dict with the grids, the dates
+    #(kept by indicator() for at least one window), the features (windows x
+    #dates), valid (the dates kept for each window), the signals (windows x
+    #uppers x lowers x dates) and the next-day returns of the benchmark.
+    #Windows are ignored by pointwise models
+    def sweep(self, uppers, lowers, windows=None):
+        param = self.window_param()
+        if param is None:
+            windows = [None]
+        elif windows is None:
+            windows = [getattr(self, param)]
+
+        self.flush_rows()
+        frames = [self.window_data(window) for window in windows]
+        dates = frames[0].index
+        for frame in frames[1:]:
+            dates = dates.union(frame.index)
+
+        feature = np.array([frame[self.feature].reindex(dates).to_numpy(dtype=float) for frame in frames])
+        valid = np.array([dates.isin(frame.index) for frame in frames])
+
+        values = feature[:, None, None, :]
+        upper = np.asarray(uppers, dtype=float)[None, :, None, None]
+        lower = np.asarray(lowers, dtype=float)[None, None, :, None]
+        signals = np.where(values<lower, self.below_low, 
+                           np.where(values>upper, self.above_up, self.other)).astype(np.int8)
+
+        prices = pd.concat([frame[self.benchmark] for frame in frames])
+        prices = prices[~prices.index.duplicated()].reindex(dates)
+        returns = (prices.shift(-1) / prices - 1).to_numpy(dtype=float)
+
+        cube = {'windows': list(windows), 
+                'uppers': list(uppers), 
+                'lowers': list(lowers), 
+                'dates': dates, 
+                'feature': feature, 
+                'valid': valid, 
+                'signals': signals, 
+                'returns': returns}
+        return cube
+
+    #Score of every combination of a sweep over the valid dates with a next-day
+    #return: mean return of following the signal (long on 1, short on -1),
+    #share of active days (signal not 0) and share of active days on the
+    #side of the return
+    def score_sweep(self, cube):
+        signals = cube['signals']
+        returns = cube['returns']
+        mask = np.broadcast_to(cube['valid'][:, None, None, :] & ~np.isnan(returns), signals.shape)
+        returns = np.where(np.isnan(returns), 0, returns)
+
+        days = mask.sum(axis=-1)
+        active = mask & (signals != 0)
+        active_days = active.sum(axis=-1)
+        hits = (active & (np.sign(signals) == np.sign(returns))).sum(axis=-1)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            scores = {'return': (signals * returns * mask).sum(axis=-1) / days, 
+                      'active': active_days / days, 
+                      'hit_rate': hits / active_days, 
+                      'days': days}
+
+        index = pd.MultiIndex.from_product([cube['windows'], cube['uppers'], cube['lowers']], 
+                                           names=['window', 'upper', 'lower'])
+        return pd.DataFrame({name: values.ravel() for name, values in scores.items()}, index=index)
+
 
 #Composite model class
 class Composite(ModelAdmin):
@@ -332,51 +663,79 @@ class Composite(ModelAdmin):
         self.models_list = models
         self.models = {}
 
+        #Column compared with the thresholds
+        self.feature = self.code
+
         ModelAdmin.__init__(self)
 
 
 
-    def load_models(self):
+    #Params (a to_dict of the composite) are set before the models are
+    #computed, so each model is computed once with them
+    def load_models(self, params=None):
         #self.data_obj.load_data()
         if self.status == 'Not Loaded':
 
             for model in self.models_list:
                 obj = model(self.data_obj, benchmark=self.benchmark, from_date=self.from_date)
-                obj.indicator()
                 self.models[obj.code] = obj
 
-                if hasattr(self, 'signal_data'):
-                    self.signal_data = self.signal_data.merge(obj.signal, how='left', left_index=True, right_index=True)
-                else:
-                    self.signal_data = obj.signal
-            
+            if params is not None:
+                self.from_dict(params)
+
+            for model in self.models:
+                self.models[model].refresh()
+
+            self.signal_data = self.merge_signals()
             self.status = 'Loaded'
             return self.signal_data
         else:
             return self.signal_data
 
-    
+    #Left-merge the signal of every model onto the dates of the first one
+    def merge_signals(self):
+        signal_data = None
+        for model in self.models:
+            obj = self.models[model]
+            if signal_data is None:
+                signal_data = obj.signal.copy()
+            else:
+                signal_data = signal_data.merge(obj.signal, how='left', left_index=True, right_index=True)
+
+        return signal_data
+
+    #Recompute only the models whose params changed and patch their column
+    #of the signal frame. The first model sets the dates of the frame, so if
+    #it changes the (cheap) merge of the cached signals is redone instead
     def refresh_models(self):
         #self.data_obj.load_data()
-        if hasattr(self, 'signal_data'):
-            delattr(self, 'signal_data')
+        if not hasattr(self, 'signal_data'):
+            return self.load_models()
+
+        base = list(self.models)[0]
+        remerge = False
 
         for model in self.models:
             obj = self.models[model]
-            obj.indicator()
-            if hasattr(self, 'signal_data'):
-                self.signal_data = self.signal_data.merge(obj.signal, how='left', left_index=True, right_index=True)
-            else:
-                self.signal_data = obj.signal
+            if obj.refresh() is True:
+                if model == base:
+                    remerge = True
+                else:
+                    self.signal_data[obj.code] = obj.signal[obj.code]
+
+        if remerge is True:
+            self.signal_data = self.merge_signals()
         
         return self.signal_data
     
     def indicator(self):
+        self.flush_rows()
         if hasattr(self, 'signal_data'):
             data = self.refresh_models()
         else:
             data = self.load_models()
         
+        data = data.copy()
         data['SUMCOMP'] = data.sum(axis=1)
         data = data[['SUMCOMP']]
         comp_data = self.data_obj[[self.benchmark]]
@@ -398,10 +757,77 @@ class Composite(ModelAdmin):
         
         self.last_stats = data.iloc[-1]
         self.last_update = data.index[-1]
-        
+        self.clean_params = self.to_dict()
 
         return data
     
+    def flush_rows(self):
+        if len(self.pending_rows) > 0:
+            self.data_obj = append_rows(self.data_obj, self.pending_rows)
+            self.pending_rows = []
+        return True
+
+    #Rebuild the state of the incremental updates: signal_data and model_data
+    #moved to buffers
+    def start_updates(self):
+        self.flush_rows()
+        self.state = {}
+        self.data_end = self.data_obj.index[-1]
+        self.signal_buffer = FrameBuffer(self.signal_data)
+        self.buffer = FrameBuffer(self.model_data)
+        return self.set_buffer_frames()
+
+    #Incremental update of every model with new rows of market data, then of
+    #the signal frame and the composite on the dates of the rows, written in
+    #place like the rows of the models. If a model was recomputed in full its
+    #whole history may have changed, and if the params of the composite changed
+    #since its last computation its old signals are stale, so in both cases the
+    #composite is redone from the merged signals. Returns True in that case
+    def update(self, new_rows):
+        if not hasattr(self, 'model_data'):
+            self.pending_rows.append(new_rows)
+            self.indicator()
+            return True
+
+        new_rows = new_rows.reindex(columns=self.data_obj.columns)
+        recomputed = False
+        for model in self.models:
+            if self.models[model].update(new_rows) is True:
+                recomputed = True
+
+        if self.is_dirty() is True:
+            recomputed = True
+        if recomputed is False and self.state_is_current() is False:
+            self.start_updates()
+        self.pending_rows.append(new_rows)
+
+        if recomputed is True:
+            self.flush_rows()
+            self.signal_data = self.merge_signals()
+            self.indicator()
+            self.state = None
+            return True
+
+        for day, benchmark in new_rows[self.benchmark].items():
+            signals = [self.models[model].buffer.get(day, 'SIGNAL') for model in self.models]
+            if np.isnan(signals[0]):
+                #Not a date of the first model, which sets the dates of the frame
+                self.signal_buffer.put(day, None)
+                self.buffer.put(day, None)
+                continue
+
+            total = np.nansum(signals)
+            self.signal_buffer.put(day, signals, dropna=False)
+            self.buffer.put(day, [total, benchmark, self.row_signal(total)])
+        self.data_end = new_rows.index.max()
+
+        self.signal_data = self.signal_buffer.frame(self.signal_buffer.index())
+        self.set_buffer_frames()
+
+        if len(self.pending_rows) >= self.pending_limit:
+            self.flush_rows()
+        return False
+
     def master_api(self):
 
         if hasattr(self, 'model_data'):
@@ -456,6 +882,9 @@ class VolSpread(ModelAdmin):
         self.below_low = 1
         self.other = 0
         
+        #Column compared with the thresholds
+        self.feature = 'AVGRATIO'
+
         ModelAdmin.__init__(self)
     
     def indicator(self):
@@ -480,6 +909,13 @@ class VolSpread(ModelAdmin):
         self.last_update = data.index[-1]
         return data
 
+    #Row of model_data (without the signal) for a new row of market data
+    def step(self, row):
+        ratio = row['ACTVOL'] / row['VIX1D.INDX']
+        average = self.roll('VOLRATIO', ratio, self.avg_window).mean()
+        return {self.benchmark: row[self.benchmark], 'ACTVOL': row['ACTVOL'], 'VIX1D.INDX': row['VIX1D.INDX'], 
+                'VOLRATIO': ratio, 'AVGRATIO': average}
+
 class VolAutocorr(ModelAdmin):
     def __init__(self, data, benchmark='SPY', from_date='2022-05-16 00:00'):
         #Meta information
@@ -499,12 +935,15 @@ class VolAutocorr(ModelAdmin):
         self.below_low = 1
         self.other = 0
         
+        #Column compared with the thresholds
+        self.feature = 'AUTOCORR'
+
         ModelAdmin.__init__(self)
     
     def indicator(self):
         #Autocorrelation with last observation over a self.lag period
         data = self.data.copy()[[self.benchmark,'ACTVOL']]
-        data['AUTOCORR'] = data['ACTVOL'].rolling(window=self.lag).apply(lambda x: x.autocorr(lag=1))
+        data['AUTOCORR'] = rolling_autocorr(data['ACTVOL'], self.lag)
 
         data.loc[data['AUTOCORR']>self.upper, 'SIGNAL'] = self.above_up
         data.loc[data['AUTOCORR']<self.lower, 'SIGNAL'] = self.below_low
@@ -522,6 +961,14 @@ class VolAutocorr(ModelAdmin):
         self.last_update = data.index[-1]
         return data
 
+    #Row of model_data (without the signal) for a new row of market data
+    def step(self, row):
+        autocorr = self.roll('ACTVOL', row['ACTVOL'], self.lag).autocorr()
+        return {self.benchmark: row[self.benchmark], 'ACTVOL': row['ACTVOL'], 'AUTOCORR': autocorr}
+
+    def window_param(self):
+        return 'lag'
+
 
 class VixSpread(ModelAdmin):
     def __init__(self, data, benchmark='SPY', from_date='2022-05-16 00:00'):
@@ -542,6 +989,9 @@ class VixSpread(ModelAdmin):
         self.below_low = 1
         self.other = 0
         
+        #Column compared with the thresholds
+        self.feature = 'AVGDIF'
+
         ModelAdmin.__init__(self)
     
     def indicator(self):
@@ -566,6 +1016,13 @@ class VixSpread(ModelAdmin):
         self.last_stats = data.iloc[-1]
         self.last_update = data.index[-1]
         return data
+
+    #Row of model_data (without the signal) for a new row of market data
+    def step(self, row):
+        difference = row['VVIX.INDX'] - row['VIX.INDX']
+        average = self.roll('VIXDIF', difference, self.avg_window).mean()
+        return {self.benchmark: row[self.benchmark], 'VIX.INDX': row['VIX.INDX'], 'VVIX.INDX': row['VVIX.INDX'], 
+                'VIXDIF': difference, 'AVGDIF': average}
     
 
 class GEX(ModelAdmin):
@@ -588,6 +1045,9 @@ class GEX(ModelAdmin):
         self.below_low = 1
         self.other = 0
         
+        #Column compared with the thresholds
+        self.feature = self.code
+
         ModelAdmin.__init__(self)
     
     def indicator(self):
@@ -610,6 +1070,10 @@ class GEX(ModelAdmin):
         self.last_stats = data.iloc[-1]
         self.last_update = data.index[-1]
         return data
+
+    #Row of model_data (without the signal) for a new row of market data
+    def step(self, row):
+        return {self.benchmark: row[self.benchmark], self.code: row['gex']}
     
 
 class Skew(ModelAdmin):
@@ -619,7 +1083,7 @@ class Skew(ModelAdmin):
         self.code = 'SKEW'
         self.description = '''Volatility Skew Index'''
         self.from_date = from_date   
-        self.params = ['upper', 'lower', 'above_up', 'below_low']
+        self.params = ['upper', 'lower', 'avg_window', 'above_up', 'below_low']
 
         #Data and model parameters
         self.avg_window = 30
@@ -633,13 +1097,16 @@ class Skew(ModelAdmin):
         self.below_low = 1
         self.other = 0
         
+        #Column compared with the thresholds
+        self.feature = 'ZSCORE'
+
         ModelAdmin.__init__(self)
     
     def indicator(self):
 
         data = self.data.copy()[[self.benchmark,'SKEW.INDX']]
         data.columns = [self.benchmark, self.code]
-        data['ZSCORE'] = data[self.code].rolling(window=self.avg_window).apply(lambda x: (x.iloc[-1] - x.mean()) / x.std())
+        data['ZSCORE'] = rolling_zscore(data[self.code], self.avg_window)
 
         data.loc[data['ZSCORE']>self.upper, 'SIGNAL'] = self.above_up
         data.loc[data['ZSCORE']<self.lower, 'SIGNAL'] = self.below_low
@@ -656,6 +1123,11 @@ class Skew(ModelAdmin):
         self.last_stats = data.iloc[-1]
         self.last_update = data.index[-1]
         return data
+
+    #Row of model_data (without the signal) for a new row of market data
+    def step(self, row):
+        zscore = self.roll(self.code, row['SKEW.INDX'], self.avg_window).zscore()
+        return {self.benchmark: row[self.benchmark], self.code: row['SKEW.INDX'], 'ZSCORE': zscore}
     
 
 class TermSt(ModelAdmin):
@@ -678,6 +1150,9 @@ class TermSt(ModelAdmin):
         self.below_low = 1
         self.other = 0
         
+        #Column compared with the thresholds
+        self.feature = 'RATIO'
+
         ModelAdmin.__init__(self)
     
     def indicator(self):
@@ -701,6 +1176,11 @@ class TermSt(ModelAdmin):
         self.last_stats = data.iloc[-1]
         self.last_update = data.index[-1]
         return data
+
+    #Row of model_data (without the signal) for a new row of market data
+    def step(self, row):
+        return {self.benchmark: row[self.benchmark], 'VIX9D': row['VIX9D.INDX'], 'VIX3M': row['VIX3M.INDX'], 
+                'RATIO': row['VIX9D.INDX']/row['VIX3M.INDX'] - 1}
     
 
 class MOVEVix(ModelAdmin):
@@ -723,6 +1203,9 @@ class MOVEVix(ModelAdmin):
         self.below_low = 1
         self.other = 0
         
+        #Column compared with the thresholds
+        self.feature = 'DIFF'
+
         ModelAdmin.__init__(self)
     
     def indicator(self):
@@ -746,6 +1229,11 @@ class MOVEVix(ModelAdmin):
         self.last_stats = data.iloc[-1]
         self.last_update = data.index[-1]
         return data
+
+    #Row of model_data (without the signal) for a new row of market data
+    def step(self, row):
+        return {self.benchmark: row[self.benchmark], 'MOVE': row['MOVE.INDX'], 'VIX': row['VIX.INDX'], 
+                'DIFF': row['MOVE.INDX'] - row['VIX.INDX']}
     
 
 class TEDSpread(ModelAdmin):
@@ -768,6 +1256,9 @@ class TEDSpread(ModelAdmin):
         self.below_low = 1
         self.other = 0
         
+        #Column compared with the thresholds
+        self.feature = 'DIFF'
+
         ModelAdmin.__init__(self)
     
     def indicator(self):
@@ -791,6 +1282,11 @@ class TEDSpread(ModelAdmin):
         self.last_stats = data.iloc[-1]
         self.last_update = data.index[-1]
         return data
+
+    #Row of model_data (without the signal) for a new row of market data
+    def step(self, row):
+        return {self.benchmark: row[self.benchmark], '3MSOFR': row['SOFR90DAYAVG'], '3MTBILL': row['DTB3'], 
+                'DIFF': row['SOFR90DAYAVG'] - row['DTB3']}
     
 
 class CrossVol(ModelAdmin):
@@ -800,7 +1296,7 @@ class CrossVol(ModelAdmin):
         self.code = 'CROSS'
         self.description = '''Cross Volatility Index'''
         self.from_date = from_date   
-        self.params = ['upper', 'lower', 'above_up', 'below_low']
+        self.params = ['upper', 'lower', 'avg_window', 'above_up', 'below_low']
 
         #Data and model parameters
         self.avg_window = 30
@@ -814,15 +1310,16 @@ class CrossVol(ModelAdmin):
         self.below_low = 1
         self.other = 0
         
+        #Column compared with the thresholds
+        self.feature = 'CORR'
+
         ModelAdmin.__init__(self)
     
     def indicator(self):
 
         data = self.data.copy()[[self.benchmark,'MOVE.INDX', 'VIX.INDX']]
         data.columns = [self.benchmark, 'MOVE', 'VIX']
-        rolling_matrices = data[['MOVE', 'VIX']].rolling(window=self.avg_window).corr()
-        index_col = rolling_matrices.where(rolling_matrices < 1.0).mean(axis=1).groupby(level=0).mean()
-        data['CORR'] = index_col
+        data['CORR'] = rolling_corr(data['MOVE'], data['VIX'], self.avg_window)
 
         data.loc[data['CORR']>self.upper, 'SIGNAL'] = self.above_up
         data.loc[data['CORR']<self.lower, 'SIGNAL'] = self.below_low
@@ -838,4 +1335,11 @@ class CrossVol(ModelAdmin):
 
         self.last_stats = data.iloc[-1]
         self.last_update = data.index[-1]
-        return data
\ No newline at end of file
+        return data
+
+    #Row of model_data (without the signal) for a new row of market data
+    def step(self, row):
+        move = self.roll('MOVE', row['MOVE.INDX'], self.avg_window)
+        vix = self.roll('VIX', row['VIX.INDX'], self.avg_window)
+        return {self.benchmark: row[self.benchmark], 'MOVE': row['MOVE.INDX'], 'VIX': row['VIX.INDX'], 
+                'CORR': move.corr(vix)}
@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+from collections import deque
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+#Vectorized rolling statistics shared by models.py and indicators.py, in place of
+#rolling(window).apply(lambda ...) which calls Python once per window.
+#Every function takes a Series or a DataFrame and returns the same shape: NaN
+#until the first full window and for windows with missing values, like the
+#rolling().apply() they replace
+
+#Function to view the data as windows, shape (rows - window + 1, [columns,] window)
+def windows(data, window):
+    values = np.asarray(data, dtype=float)
+    return sliding_window_view(values, window, axis=0)
+
+#Function to put the per-window results back on the index of data
+def align(data, result, window):
+    values = np.full(np.shape(data), np.nan)
+    if len(result) > 0:
+        values[window - 1:] = result
+
+    if isinstance(data, pd.DataFrame):
+        return pd.DataFrame(values, index=data.index, columns=data.columns)
+    return pd.Series(values, index=data.index, name=data.name)
+
+#Rolling autocorrelation, same as rolling(window).apply(lambda x: x.autocorr(lag)):
+#Pearson correlation of each window with itself shifted by lag. Each window is
+#centered before the products (two-pass), as Series.corr does, so the result
+#matches the lambda path to rounding. Constant windows give NaN
+def rolling_autocorr(data, window, lag=1):
+    if len(data) < window:
+        return align(data, [], window)
+
+    view = windows(data, window)
+    current = view[..., lag:]
+    previous = view[..., :-lag]
+    current = current - current.mean(axis=-1, keepdims=True)
+    previous = previous - previous.mean(axis=-1, keepdims=True)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        result = (current * previous).sum(axis=-1) / np.sqrt((current ** 2).sum(axis=-1) * (previous ** 2).sum(axis=-1))
+
+    return align(data, result, window)
+
+#Rolling mean, std (ddof=1, as Series.std), min and max on pandas' native O(n)
+#rolling aggregations
+def rolling_mean(data, window):
+    return data.rolling(window=window).mean()
+
+def rolling_std(data, window):
+    return data.rolling(window=window).std()
+
+def rolling_min(data, window):
+    return data.rolling(window=window).min()
+
+def rolling_max(data, window):
+    return data.rolling(window=window).max()
+
+#Z-score of the last value of each window, same as
+#rolling(window).apply(lambda x: (x.iloc[-1] - x.mean()) / x.std()). Constant windows give NaN
+def rolling_zscore(data, window):
+    std = rolling_std(data, window)
+    return (data - rolling_mean(data, window)) / std.where(std > 0)
+
+#Rolling Pearson correlation of two series with pandas' pairwise rolling corr,
+#one value per date instead of a correlation matrix per date
+def rolling_corr(x, y, window):
+    return x.rolling(window=window).corr(y)
+
+#Average pairwise rolling correlation of the columns of data, the off-diagonal
+#mean of each date's correlation matrix without building the matrices.
+#Pairs with no value on a date (missing data) are left out of that date's mean
+def rolling_avg_corr(data, window):
+    columns = list(data.columns)
+    pairs = [rolling_corr(data[first], data[second], window)
+             for i, first in enumerate(columns) for second in columns[i + 1:]]
+    return pd.concat(pairs, axis=1).mean(axis=1)
+
+
+#Last window values of a series, the state of a rolling statistic updated one
+#date at a time (ModelAdmin.update). Each statistic is computed on the values
+#of the window, O(window) per date, with the same NaN rules as the functions
+#above: NaN until the window is full and while it holds a missing value
+class RollingWindow:
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque(maxlen=window)
+
+    #Add the value of a new date, or replace the last one with a fresher
+    #value of the same date (the value that left the window stays out)
+    def push(self, value, replace=False):
+        if replace is True and len(self.values) > 0:
+            self.values[-1] = value
+        else:
+            self.values.append(value)
+        return self
+
+    #Values of a full window without missing values, None otherwise
+    def array(self):
+        if len(self.values) < self.window:
+            return None
+        values = np.array(self.values, dtype=float)
+        if np.isnan(values).any():
+            return None
+        return values
+
+    def mean(self):
+        values = self.array()
+        if values is None:
+            return np.nan
+        return values.mean()
+
+    def zscore(self):
+        values = self.array()
+        if values is None:
+            return np.nan
+        std = values.std(ddof=1)
+        if std > 0:
+            return (values[-1] - values.mean()) / std
+        return np.nan
+
+    def autocorr(self, lag=1):
+        values = self.array()
+        if values is None:
+            return np.nan
+        return pearson(values[lag:], values[:-lag])
+
+    def corr(self, other):
+        values = self.array()
+        other_values = other.array()
+        if values is None or other_values is None:
+            return np.nan
+        return pearson(values, other_values)
+
+
+#Pearson correlation of two arrays, centered first (two-pass) as rolling_autocorr
+def pearson(x, y):
+    x = x - x.mean()
+    y = y - y.mean()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (x * y).sum() / np.sqrt((x ** 2).sum() * (y ** 2).sum())
@@ -3,7 +3,7 @@ from content import eod, gex, fred
 
 def update_sequence():
     symbols = eod.priority_update_set()
-    eod.Historical(symbols).update_sequence()
+    eod.Historical(symbols, incremental=True).update_sequence()
     eod.Intraday('SPY').update_sequence()
     gex.DIX().update_sequence()
     fred.Observations(['DTB3','SOFR90DAYAVG' ]).update_sequence()